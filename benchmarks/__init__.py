@@ -0,0 +1,6 @@
+"""
+Benchmarks of the curve deformer editor hot paths. They run outside maya
+with an offscreen Qt platform and the in-memory maya stand-in of
+benchmarks.fakemaya.
+usage: python -m benchmarks.run --output results.json
+"""
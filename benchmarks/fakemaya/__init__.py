@@ -0,0 +1,17 @@
+"""
+In-memory stand-in for the maya modules used by the curve deformer editor.
+install() makes the fake "maya" package importable. It has to be called
+before any curvedeformereditor import.
+"""
+import os
+import sys
+
+
+ROOT = os.path.dirname(os.path.realpath(__file__))
+
+
+def install():
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    from maya import _fakescene
+    return _fakescene
@@ -0,0 +1,105 @@
+"""
+Fake maya.OpenMaya (API 1.0) covering the classes used by the curve
+deformer editor.
+"""
+from maya import _fakescene
+from maya._fakescene import counted
+
+
+class MObject():
+    def __init__(self):
+        self.node = None
+
+
+class MIntArray(list):
+    pass
+
+
+class MPlug():
+    def __init__(self):
+        self.node = None
+        self.attribute = None
+        self.index = None
+
+    def elementByLogicalIndex(self, index):
+        plug = MPlug()
+        plug.node = self.node
+        plug.attribute = self.attribute
+        plug.index = index
+        return plug
+
+    def _multi(self):
+        return self.node.multis.setdefault(self.attribute, {})
+
+    @counted("MPlug.setDouble")
+    def setDouble(self, value):
+        self._multi()[self.index] = float(value)
+
+    @counted("MPlug.asDouble")
+    def asDouble(self):
+        return self._multi().get(self.index, _fakescene.DEFAULT_WEIGHT)
+
+    @counted("MPlug.getExistingArrayAttributeIndices")
+    def getExistingArrayAttributeIndices(self, array):
+        array.extend(sorted(self._multi()))
+        return len(array)
+
+    def partialName(self, *_):
+        return (self.attribute or "").split(".")[-1]
+
+
+class MSelectionList():
+    def __init__(self):
+        self.items = []
+
+    @counted("MSelectionList.add")
+    def add(self, name):
+        self.items.append(name)
+
+    def getPlug(self, index, plug):
+        scene = _fakescene.scene
+        name, attribute, start, _ = _fakescene.split_plug(self.items[index])
+        plug.node = scene.attribute_node(scene.node(name), attribute)
+        plug.attribute = attribute
+        plug.index = start
+
+    def getDependNode(self, index, mobject):
+        mobject.node = _fakescene.scene.node(self.items[index])
+
+
+class MMessage():
+    @staticmethod
+    def removeCallback(identifier):
+        _fakescene.remove_callback(identifier)
+
+
+class MEventMessage(MMessage):
+    @staticmethod
+    def addEventCallback(event, function):
+        return _fakescene.add_callback(_fakescene.EVENT, function, event)
+
+
+class MSceneMessage(MMessage):
+    kBeforeNew = _fakescene.BEFORE_NEW
+    kBeforeOpen = _fakescene.BEFORE_OPEN
+
+    @staticmethod
+    def addCallback(message, function):
+        return _fakescene.add_callback(_fakescene.SCENE, function, message)
+
+
+class MDGMessage(MMessage):
+    @staticmethod
+    def addConnectionCallback(function):
+        return _fakescene.add_callback(_fakescene.CONNECTION, function)
+
+
+class MNodeMessage(MMessage):
+    kConnectionMade = 1
+    kConnectionBroken = 2
+    kAttributeSet = _fakescene.ATTRIBUTE_SET
+
+    @staticmethod
+    def addAttributeChangedCallback(mobject, function):
+        return _fakescene.add_callback(
+            _fakescene.ATTRIBUTE_CHANGED, function, mobject.node)
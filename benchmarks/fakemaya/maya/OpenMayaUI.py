@@ -0,0 +1,4 @@
+class MQtUtil():
+    @staticmethod
+    def mainWindow():
+        return None
@@ -0,0 +1,241 @@
+"""
+The scene model shared by the fake maya.cmds and maya.OpenMaya modules.
+It models the nurbsCurve shapes with their degree and spans, the deformers
+connected through their outputGeometry attribute with their weights multi
+attributes, the selection, the API callbacks and the undo queue. Every
+command and API call is counted in the calls counter.
+"""
+import collections
+import functools
+import itertools
+import re
+
+
+DEFAULT_WEIGHT = 1.0
+WEIGHTS_ATTRIBUTES = {
+    "blendShape": "inputTarget[{0}].inputTargetGroup[{0}].targetWeights",
+    "cluster": "weightList[{0}].weights",
+    "skinCluster": "weightList[{0}].weights"
+}
+PLUG_REGEX = re.compile(r"^([^.]+)\.(.+?)(?:\[(\d+)(?::(\d+))?\])?$")
+
+# callback kinds
+EVENT = "event"
+SCENE = "scene"
+CONNECTION = "connection"
+ATTRIBUTE_CHANGED = "attributechanged"
+# same values as the fake OpenMaya constants
+BEFORE_NEW = 0
+BEFORE_OPEN = 1
+ATTRIBUTE_SET = 8
+
+calls = collections.Counter()
+# {identifier: (kind, function, argument)}, they survive new_scene as the
+# maya callbacks survive a new scene.
+callbacks = {}
+_callback_ids = itertools.count(1)
+
+
+def counted(name):
+    """ Decorator counting the calls of a fake maya function. """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            calls[name] += 1
+            return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def reset_calls():
+    calls.clear()
+
+
+class Node():
+    def __init__(self, name, nodetype, parent=None):
+        self.name = name
+        self.type = nodetype
+        self.parent = parent
+        self.children = []
+        self.intermediate = False
+        self.attributes = {}
+        # multi attributes, e.g. {"weightList[0].weights": {0: 1.0, 3: .5}}
+        self.multis = {}
+        if parent is not None:
+            parent.children.append(self)
+
+
+class Scene():
+    def __init__(self):
+        self.nodes = {}
+        # list of (source plug, destination plug)
+        self.connections = []
+        self.selection = []
+        # list of undo entries, a closed chunk is one entry.
+        self.undo_queue = []
+        self.undo_chunk = None
+        self.undo_chunk_depth = 0
+        self.undo_enabled = True
+
+    def node(self, name):
+        name = short_name(name)
+        try:
+            return self.nodes[name]
+        except KeyError:
+            raise ValueError("No object matches name: {}".format(name))
+
+    def add_node(self, name, nodetype, parent=None):
+        if name in self.nodes:
+            raise ValueError("{} already exists".format(name))
+        node = Node(name, nodetype, parent)
+        self.nodes[name] = node
+        return node
+
+    def attribute_node(self, node, attribute):
+        """
+        As maya does, an attribute not found on a transform is looked up on
+        its shape.
+        """
+        if attribute in node.attributes or attribute in node.multis:
+            return node
+        for child in node.children:
+            if child.intermediate:
+                continue
+            if attribute in child.attributes or attribute in child.multis:
+                return child
+        return node
+
+    def long_name(self, node):
+        names = []
+        while node is not None:
+            names.insert(0, node.name)
+            node = node.parent
+        return "|" + "|".join(names)
+
+    def connect(self, source, destination):
+        self.connections.append((source, destination))
+        fire_callbacks(CONNECTION, None, source, destination, True)
+
+    def record_undo(self, entry):
+        """ An entry is a (dict, copy of the dict before the change) tuple. """
+        if self.undo_enabled is False:
+            return
+        if self.undo_chunk is not None:
+            self.undo_chunk.append(entry)
+            return
+        self.undo_queue.append([entry])
+
+    def open_undo_chunk(self):
+        self.undo_chunk_depth += 1
+        if self.undo_chunk is None:
+            self.undo_chunk = []
+
+    def close_undo_chunk(self):
+        self.undo_chunk_depth = max(0, self.undo_chunk_depth - 1)
+        if self.undo_chunk_depth or self.undo_chunk is None:
+            return
+        if self.undo_chunk:
+            self.undo_queue.append(self.undo_chunk)
+        self.undo_chunk = None
+
+    def undo(self):
+        """ Undo the last entry and return the number of undone records. """
+        if not self.undo_queue:
+            return 0
+        entry = self.undo_queue.pop()
+        for multi, previous in reversed(entry):
+            multi.clear()
+            multi.update(previous)
+        return len(entry)
+
+
+def short_name(name):
+    return name.split("|")[-1]
+
+
+def split_plug(plug):
+    """
+    Return the node name, the attribute path and the multi indices range of
+    a plug. e.g.
+    "cluster1.weightList[0].weights[2:5]" -> (
+        "cluster1", "weightList[0].weights", 2, 5)
+    "curve1.degree" -> ("curve1", "degree", None, None)
+    """
+    match = PLUG_REGEX.match(plug)
+    if match is None:
+        raise ValueError("Invalid plug: {}".format(plug))
+    node, attribute, start, end = match.groups()
+    start = int(start) if start is not None else None
+    end = int(end) if end is not None else start
+    return short_name(node), attribute, start, end
+
+
+def add_callback(kind, function, argument=None):
+    identifier = next(_callback_ids)
+    callbacks[identifier] = (kind, function, argument)
+    return identifier
+
+
+def remove_callback(identifier):
+    callbacks.pop(identifier, None)
+
+
+def fire_callbacks(kind, argument, *args):
+    """
+    Call the functions registered for the given kind of callback. The
+    argument filter the callbacks: event name, scene message or node.
+    """
+    for kind_, function, argument_ in list(callbacks.values()):
+        if kind_ != kind:
+            continue
+        if argument_ is not None and argument_ != argument:
+            continue
+        function(*args)
+
+
+scene = Scene()
+
+
+def new_scene(open_=False):
+    global scene
+    fire_callbacks(SCENE, BEFORE_OPEN if open_ else BEFORE_NEW, None)
+    scene = Scene()
+    return scene
+
+
+def create_curve(name, degree=3, spans=1):
+    transform = scene.add_node(name, "transform")
+    shape = scene.add_node(name + "Shape", "nurbsCurve", transform)
+    shape.attributes["degree"] = degree
+    shape.attributes["spans"] = spans
+    return transform.name
+
+
+def create_deformer(name, nodetype, curves):
+    """
+    Create a deformer connected to the given curves. As maya does, an
+    intermediate original shape is created under the curves not deformed
+    yet. Every curve get its own outputGeometry index and an empty weights
+    multi attribute, the weights not set are DEFAULT_WEIGHT.
+    """
+    if nodetype not in WEIGHTS_ATTRIBUTES:
+        raise ValueError("Unsupported deformer type: {}".format(nodetype))
+    deformer = scene.add_node(name, nodetype)
+    for index, curve in enumerate(curves):
+        transform = scene.node(curve)
+        shape = [c for c in transform.children if not c.intermediate][0]
+        original = shape.name + "Orig"
+        if original not in scene.nodes:
+            orig = scene.add_node(original, "nurbsCurve", transform)
+            orig.intermediate = True
+            orig.attributes.update(shape.attributes)
+        source = "{}.outputGeometry[{}]".format(name, index)
+        scene.connect(source, shape.name + ".create")
+        attribute = WEIGHTS_ATTRIBUTES[nodetype].format(index)
+        deformer.multis[attribute] = {}
+    return name
+
+
+def select(nodes):
+    scene.selection = [scene.node(node) for node in nodes]
+    fire_callbacks(EVENT, "SelectionChanged", None)
@@ -0,0 +1,183 @@
+"""
+Fake maya.cmds covering the commands used by the curve deformer editor.
+"""
+from maya import _fakescene
+from maya._fakescene import counted
+
+
+try:
+    string_types = basestring
+except NameError:
+    string_types = str
+
+
+def _scene():
+    return _fakescene.scene
+
+
+def _flatten(nodes):
+    flatten = []
+    for node in nodes:
+        flatten.extend([node] if isinstance(node, string_types) else node)
+    return flatten
+
+
+@counted("cmds.nodeType")
+def nodeType(node):
+    return _scene().node(node).type
+
+
+@counted("cmds.listRelatives")
+def listRelatives(node, type=None, noIntermediate=False, parent=False, **_):
+    node = _scene().node(node)
+    if parent is True:
+        return [node.parent.name] if node.parent is not None else None
+    children = [
+        child.name for child in node.children
+        if (type is None or child.type == type) and
+        not (noIntermediate and child.intermediate)]
+    return children or None
+
+
+@counted("cmds.listConnections")
+def listConnections(plug, plugs=False, connections=False, **_):
+    result = []
+    for source, destination in _scene().connections:
+        if source != plug and not source.startswith(plug + "["):
+            continue
+        if connections is True:
+            result.append(source)
+        result.append(destination if plugs else destination.split(".")[0])
+    return result or None
+
+
+@counted("cmds.listHistory")
+def listHistory(nodes, **_):
+    scene = _scene()
+    nodes = _flatten([nodes])
+    shapes = []
+    for node in nodes:
+        node = scene.node(node)
+        shapes.extend([node] if node.type != "transform" else node.children)
+    history = [shape.name for shape in shapes]
+    for source, destination in scene.connections:
+        if destination.split(".")[0] in history:
+            deformer = source.split(".")[0]
+            if deformer not in history:
+                history.append(deformer)
+    return history
+
+
+@counted("cmds.ls")
+def ls(*nodes, **kwargs):
+    scene = _scene()
+    if kwargs.get("selection"):
+        selected = list(scene.selection)
+    else:
+        selected = [scene.node(node) for node in _flatten(nodes)]
+    if kwargs.get("dag"):
+        expanded = []
+        for node in selected:
+            expanded.append(node)
+            expanded.extend(node.children)
+        selected = expanded
+    types = kwargs.get("type")
+    if types is not None:
+        types = [types] if isinstance(types, string_types) else types
+        selected = [node for node in selected if node.type in types]
+    if kwargs.get("noIntermediate"):
+        selected = [node for node in selected if not node.intermediate]
+    if kwargs.get("long"):
+        return [scene.long_name(node) for node in selected]
+    return [node.name for node in selected]
+
+
+@counted("cmds.select")
+def select(*nodes, **kwargs):
+    if kwargs.get("clear"):
+        nodes = []
+    _fakescene.select(_flatten(nodes))
+
+
+@counted("cmds.attributeQuery")
+def attributeQuery(attribute, node=None, exists=False, **_):
+    node = _scene().node(node)
+    return attribute in node.attributes or attribute in node.multis
+
+
+@counted("cmds.addAttr")
+def addAttr(node, longName=None, dataType=None, **_):
+    node = _scene().node(node)
+    if longName in node.attributes:
+        raise RuntimeError("{} already exists".format(longName))
+    # a new string attribute has no value.
+    node.attributes[longName] = None
+
+
+@counted("cmds.getAttr")
+def getAttr(plug, multiIndices=False, **_):
+    scene = _scene()
+    name, attribute, start, end = _fakescene.split_plug(plug)
+    node = scene.attribute_node(scene.node(name), attribute)
+    if attribute in node.attributes and start is None:
+        return node.attributes[attribute]
+    multi = node.multis.get(attribute)
+    if multi is None:
+        raise ValueError("No attribute matches: {}".format(plug))
+    if multiIndices is True:
+        return sorted(multi) or None
+    if start is None:
+        # as maya, the values of a whole multi are returned in a tuple
+        # wrapped in a list.
+        return [tuple(multi[index] for index in sorted(multi))]
+    if start == end and ":" not in plug.split("[")[-1]:
+        return multi.get(start, _fakescene.DEFAULT_WEIGHT)
+    return [multi[i] for i in range(start, end + 1) if i in multi]
+
+
+@counted("cmds.setAttr")
+def setAttr(plug, *values, **kwargs):
+    from maya import OpenMaya
+    scene = _scene()
+    name, attribute, start, end = _fakescene.split_plug(plug)
+    node = scene.attribute_node(scene.node(name), attribute)
+    if start is None:
+        scene.record_undo((node.attributes, dict(node.attributes)))
+        node.attributes[attribute] = values[0]
+        mplug = OpenMaya.MPlug()
+        mplug.node, mplug.attribute = node, attribute
+        _fakescene.fire_callbacks(
+            _fakescene.ATTRIBUTE_CHANGED, node, _fakescene.ATTRIBUTE_SET,
+            mplug, OpenMaya.MPlug(), None)
+        return
+    size = kwargs.get("size", kwargs.get("s"))
+    if size is not None and size != end - start + 1:
+        raise RuntimeError("size doesn't match the plug range: " + plug)
+    if len(values) != end - start + 1:
+        raise RuntimeError("values don't match the plug range: " + plug)
+    multi = node.multis.setdefault(attribute, {})
+    scene.record_undo((multi, dict(multi)))
+    for i, value in zip(range(start, end + 1), values):
+        multi[i] = float(value)
+
+
+@counted("cmds.undoInfo")
+def undoInfo(openChunk=False, closeChunk=False, stateWithoutFlush=None, **_):
+    scene = _scene()
+    if openChunk:
+        scene.open_undo_chunk()
+    if closeChunk:
+        scene.close_undo_chunk()
+    if stateWithoutFlush is not None:
+        scene.undo_enabled = bool(stateWithoutFlush)
+
+
+@counted("cmds.undo")
+def undo():
+    _scene().undo()
+
+
+@counted("cmds.file")
+def file(*_, **kwargs):
+    if kwargs.get("new") or kwargs.get("open"):
+        _fakescene.new_scene(open_=bool(kwargs.get("open")))
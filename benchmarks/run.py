@@ -0,0 +1,349 @@
+"""
+Time the curve sampling, auto tangent and weights I/O hot paths over a
+matrix of control point, cv and curve counts and dump the results as json.
+The drag benchmark also records the maya commands and undo records
+produced by a whole interaction.
+usage:
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --compare previous.json
+    python -m benchmarks.run drag --output commands.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import timeit
+
+from benchmarks import fakemaya
+
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+fakescene = fakemaya.install()
+
+from PySide2 import QtCore, QtGui, QtWidgets  # noqa: E402
+from curvedeformereditor.arrayutils import (  # noqa: E402
+    get_break_indices, get_break_indices_array, numpy, split_value,
+    split_value_array)
+from curvedeformereditor.beziercurve import (  # noqa: E402
+    auto_tangent_beziercurve, compute_bezier_curve_values,
+    compute_bezier_curve_values_batch, create_beziercurve,
+    get_default_sampling_threads)
+from curvedeformereditor.fitting import fit_values  # noqa: E402
+
+
+EDITOR_SIZE = QtCore.QSize(400, 300)
+CONTROLPOINT_COUNTS = 2, 8, 32, 128
+SAMPLE_COUNTS = 10, 100, 1000
+VALUES_COUNTS = 10, 100, 1000
+ARRAY_LENGTHS = 100, 1000, 10000, 100000
+CURVE_COUNTS = 1, 10, 100
+CV_COUNTS = 10, 100
+FITTING_TOLERANCES = 1e-2, 1e-3
+# distinct cv counts sampled together, e.g. a selection of curves with
+# different resolutions.
+BATCH_SAMPLES = (
+    (10, 20, 50),
+    (100, 250, 500, 1000),
+    (1000, 5000, 20000, 50000))
+# 1 is the serial sampling.
+SAMPLING_THREADS = sorted({1, max(2, get_default_sampling_threads())})
+DRAG_MOVES = 20
+
+
+def random_values(count, seed=0):
+    generator = random.Random(seed)
+    return [generator.random() for _ in range(count)]
+
+
+def random_beziercurve(controlpoints_count):
+    controlpoints = create_beziercurve(
+        random_values(controlpoints_count), linear=False)
+    controlpoints[0].isboundary = True
+    controlpoints[-1].isboundary = True
+    return controlpoints
+
+
+def measure(function, repeat):
+    timer = timeit.Timer(function)
+    # calibrate the number of calls per measure to last at least 20ms.
+    number, _ = timer.autorange() if hasattr(timer, 'autorange') else (1, 0)
+    times = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        'best': min(times),
+        'mean': sum(times) / len(times),
+        'number': number,
+        'repeat': repeat}
+
+
+def bench_compute_bezier_curve_values(repeat):
+    for count in CONTROLPOINT_COUNTS:
+        controlpoints = random_beziercurve(count)
+        for sample in SAMPLE_COUNTS:
+            def function():
+                compute_bezier_curve_values(controlpoints, sample)
+            parameters = {'controlpoints': count, 'sample': sample}
+            yield parameters, measure(function, repeat)
+
+
+def bench_compute_bezier_curve_values_batch(repeat):
+    controlpoints = random_beziercurve(8)
+    for samples in BATCH_SAMPLES:
+        for threads in SAMPLING_THREADS:
+            def function():
+                compute_bezier_curve_values_batch(
+                    controlpoints, samples, threads=threads)
+            parameters = {'values': sum(samples), 'threads': threads}
+            yield parameters, measure(function, repeat)
+
+
+def bench_auto_tangent_beziercurve(repeat):
+    for count in CONTROLPOINT_COUNTS:
+        controlpoints = random_beziercurve(count)
+
+        def function():
+            auto_tangent_beziercurve(controlpoints)
+        yield {'controlpoints': count}, measure(function, repeat)
+
+
+def bench_create_beziercurve(repeat):
+    for count in VALUES_COUNTS:
+        values = random_values(count)
+
+        def function():
+            create_beziercurve(values, linear=False)
+        yield {'values': count}, measure(function, repeat)
+
+
+def bench_fit_values(repeat):
+    for count in VALUES_COUNTS:
+        # a smooth profile with some paint noise.
+        generator = random.Random(count)
+        values = [
+            0.5 + 0.4 * math.sin(i * 12.0 / count) +
+            generator.uniform(-.005, .005) for i in range(count)]
+        for tolerance in FITTING_TOLERANCES:
+            def function():
+                fit_values(values, tolerance)
+            parameters = {'values': count, 'tolerance': tolerance}
+            yield parameters, measure(function, repeat)
+
+
+def bench_get_break_indices(repeat):
+    for length in ARRAY_LENGTHS:
+        values = random_values(length)
+
+        def function():
+            get_break_indices(values)
+        yield {'length': length}, measure(function, repeat)
+
+
+def bench_get_break_indices_array(repeat):
+    if numpy is None:
+        return
+    for length in ARRAY_LENGTHS:
+        values = numpy.array(random_values(length))
+
+        def function():
+            get_break_indices_array(values)
+        yield {'length': length}, measure(function, repeat)
+
+
+def bench_split_value(repeat):
+    for length in ARRAY_LENGTHS:
+        def function():
+            split_value(1.0, length)
+        yield {'length': length}, measure(function, repeat)
+
+
+def bench_split_value_array(repeat):
+    if numpy is None:
+        return
+    for length in ARRAY_LENGTHS:
+        def function():
+            split_value_array(1.0, length)
+        yield {'length': length}, measure(function, repeat)
+
+
+def create_editor_scene(curves_count, cvs_count):
+    from curvedeformereditor.mainview import CurveDeformerEditor
+    fakescene.new_scene()
+    curves = [
+        fakescene.create_curve('curve{}'.format(i), degree=3,
+                               spans=cvs_count - 3)
+        for i in range(curves_count)]
+    fakescene.create_deformer('cluster1', 'cluster', curves)
+    fakescene.select(curves)
+    editor = CurveDeformerEditor()
+    editor.resize(EDITOR_SIZE)
+    # the equalizer get its size and its view scale when it is shown.
+    editor.show()
+    editor.bezierequalizer.controlpoints = random_beziercurve(8)
+    return editor
+
+
+def bench_weightschanged(repeat):
+    for curves_count in CURVE_COUNTS:
+        for cvs_count in CV_COUNTS:
+            editor = create_editor_scene(curves_count, cvs_count)
+            parameters = {'curves': curves_count, 'cvs': cvs_count}
+            yield parameters, measure(editor.weightschanged, repeat)
+            editor.unregister_callback()
+            editor.deleteLater()
+
+
+def mouse_event(eventtype, point):
+    button = QtCore.Qt.LeftButton
+    return QtGui.QMouseEvent(
+        eventtype, QtCore.QPointF(point), button, button,
+        QtCore.Qt.NoModifier)
+
+
+def drag(editor, moves):
+    """
+    Simulate a drag of the middle control point of the editor bezier curve.
+    The event loop is processed after every move to let the coalesced
+    weights push happen.
+    """
+    application = QtWidgets.QApplication.instance()
+    equalizer = editor.bezierequalizer
+    controlpoints = sorted(equalizer.controlpoints)
+    center = controlpoints[len(controlpoints) // 2].center
+    scale_x, scale_y = equalizer.view_scale
+    point = QtCore.QPoint(
+        int(center.x() * scale_x), int(center.y() * scale_y))
+    equalizer.mousePressEvent(
+        mouse_event(QtCore.QEvent.MouseButtonPress, point))
+    for i in range(moves):
+        point = QtCore.QPoint(
+            point.x(), (point.y() + 7) % equalizer.height())
+        equalizer.mouseMoveEvent(
+            mouse_event(QtCore.QEvent.MouseMove, point))
+        application.processEvents()
+    equalizer.mouseReleaseEvent(
+        mouse_event(QtCore.QEvent.MouseButtonRelease, point))
+
+
+def bench_drag(_):
+    """
+    Measure a whole drag once and count the maya commands and the undo
+    records it produced.
+    """
+    for curves_count in CURVE_COUNTS:
+        for cvs_count in CV_COUNTS:
+            editor = create_editor_scene(curves_count, cvs_count)
+            fakescene.reset_calls()
+            start = timeit.default_timer()
+            drag(editor, DRAG_MOVES)
+            elapsed = timeit.default_timer() - start
+            undo_queue = fakescene.scene.undo_queue
+            parameters = {
+                'curves': curves_count, 'cvs': cvs_count,
+                'moves': DRAG_MOVES}
+            yield parameters, {
+                'best': elapsed,
+                'mean': elapsed,
+                'number': 1,
+                'repeat': 1,
+                'calls': dict(fakescene.calls),
+                'undo_entries': len(undo_queue),
+                'undo_records': sum(len(entry) for entry in undo_queue)}
+            editor.unregister_callback()
+            editor.deleteLater()
+
+
+BENCHMARKS = {
+    'compute_bezier_curve_values': bench_compute_bezier_curve_values,
+    'compute_bezier_curve_values_batch':
+        bench_compute_bezier_curve_values_batch,
+    'auto_tangent_beziercurve': bench_auto_tangent_beziercurve,
+    'create_beziercurve': bench_create_beziercurve,
+    'fit_values': bench_fit_values,
+    'get_break_indices': bench_get_break_indices,
+    'get_break_indices_array': bench_get_break_indices_array,
+    'split_value': bench_split_value,
+    'split_value_array': bench_split_value_array,
+    'weightschanged': bench_weightschanged,
+    'drag': bench_drag,
+}
+
+
+def get_commit():
+    try:
+        output = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.realpath(__file__)))
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode().strip()
+
+
+def run(names, repeat):
+    results = []
+    for name in names:
+        for parameters, timing in BENCHMARKS[name](repeat):
+            result = {'name': name, 'parameters': parameters}
+            result.update(timing)
+            results.append(result)
+            print('{:<30}{:<40}{:>12.6f}ms'.format(
+                name, json.dumps(parameters, sort_keys=True),
+                timing['best'] * 1000))
+    return {
+        'commit': get_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results}
+
+
+def result_key(result):
+    return result['name'], json.dumps(result['parameters'], sort_keys=True)
+
+
+def compare(report, reference):
+    """ Print the best time ratio of every benchmark against a reference. """
+    references = {result_key(r): r for r in reference['results']}
+    print('\ncompared to {}:'.format(reference.get('commit')))
+    for result in report['results']:
+        previous = references.get(result_key(result))
+        if previous is None:
+            continue
+        ratio = result['best'] / previous['best']
+        line = '{:<30}{:<40}{:>10.2f}x'.format(
+            result['name'], json.dumps(result['parameters'], sort_keys=True),
+            ratio)
+        if 'calls' in result and 'calls' in previous:
+            line += '  calls: {} -> {}'.format(
+                sum(previous['calls'].values()),
+                sum(result['calls'].values()))
+        print(line)
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        'benchmarks', nargs='*',
+        help='benchmarks to run, all by default: ' + ', '.join(BENCHMARKS))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='json file to write the results')
+    parser.add_argument('--compare', help='json results to compare with')
+    arguments = parser.parse_args(arguments)
+    unknowns = set(arguments.benchmarks) - set(BENCHMARKS)
+    if unknowns:
+        parser.error('unknown benchmarks: ' + ', '.join(sorted(unknowns)))
+
+    application = QtWidgets.QApplication.instance()
+    application = application or QtWidgets.QApplication(sys.argv)
+    report = run(arguments.benchmarks or sorted(BENCHMARKS), arguments.repeat)
+    if arguments.output:
+        with open(arguments.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    if arguments.compare:
+        with open(arguments.compare, 'r') as f:
+            compare(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
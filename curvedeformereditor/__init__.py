@@ -1,13 +1,14 @@
-import shiboken2
-import maya.OpenMayaUI as omui
-from PySide2 import QtWidgets
-from curvedeformereditor.mainview import CurveDeformerEditor
-
-
 _curve_deformer_editor = None
 
 
 def launch():
+    # The GUI is imported on launch only, the curve modules (beziercurve,
+    # fitting, arrayutils) can be used without Qt, e.g. in mayapy batch jobs.
+    import shiboken2
+    import maya.OpenMayaUI as omui
+    from PySide2 import QtWidgets
+    from curvedeformereditor.mainview import CurveDeformerEditor
+
     global _curve_deformer_editor
     if _curve_deformer_editor is None:
         main_window = omui.MQtUtil.mainWindow()
@@ -1,3 +1,7 @@
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 def clamp(value, minimum, maximum):
@@ -22,13 +26,16 @@ def get_break_indices(array):
     ___________________________________
     This will return the indices 0, 3, 4 and 7
     """
+    if numpy is not None and isinstance(array, numpy.ndarray):
+        return get_break_indices_array(array)
     break_indexes = []
+    last = len(array) - 1
     for i, value in enumerate(array):
         if i == 0:
             previous_value = value
             break_indexes.append(i)
             continue
-        if i == len(array) - 1:
+        if i == last:
             break_indexes.append(i)
             break
         next_value = array[i + 1]
@@ -39,6 +46,19 @@ def get_break_indices(array):
     return break_indexes
 
 
+def get_break_indices_array(array):
+    """
+    Vectorized version of get_break_indices. It requires numpy, accept any
+    sequence and return the indices as a numpy array.
+    """
+    array = numpy.asarray(array, dtype=float)
+    if len(array) < 3:
+        return numpy.arange(len(array))
+    averages = (array[2:] + array[:-2]) / 2.0
+    breaks = numpy.flatnonzero(numpy.abs(array[1:-1] - averages) > 1e-2)
+    return numpy.concatenate(([0], breaks + 1, [len(array) - 1]))
+
+
 def split_value(value, sample):
     """
     This array utils split a float in list of sample from 0 to the given value.
@@ -48,3 +68,53 @@ def split_value(value, sample):
     """
     increment = value / (sample - 1)
     return [increment * i for i in range(sample)]
+
+
+def split_value_array(value, sample):
+    """
+    Vectorized version of split_value. It requires numpy and return a numpy
+    array with the same values.
+    """
+    increment = value / (sample - 1)
+    return increment * numpy.arange(sample)
+
+
+def resample_values(values, sample):
+    """
+    This array utils linearly interpolate a list of values to a new number
+    of samples. The first and the last values are kept.
+    e.g. resample_values([0.0, 1.0], 5) will return:
+    [0.0, 0.25, 0.5, 0.75, 1.0]
+    """
+    if sample == len(values):
+        return list(values)
+    positions = split_value(float(len(values) - 1), sample)
+    resampled = []
+    for position in positions:
+        index = min(int(position), len(values) - 2)
+        factor = position - index
+        resampled.append(
+            values[index] * (1 - factor) + values[index + 1] * factor)
+    return resampled
+
+
+def get_changed_ranges(old_values, new_values, tolerance=1e-4):
+    """
+    This function compare two lists of values with the same length and
+    return the contiguous ranges where the values differ more than the
+    tolerance, as (start, end) tuples with end excluded.
+    e.g. get_changed_ranges([0, 0, 0, 0, 0], [1, 1, 0, 0, 1]) will return
+    [(0, 2), (4, 5)]
+    """
+    ranges = []
+    start = None
+    for i, (old, new) in enumerate(zip(old_values, new_values)):
+        changed = abs(old - new) > tolerance
+        if changed and start is None:
+            start = i
+        elif not changed and start is not None:
+            ranges.append((start, i))
+            start = None
+    if start is not None:
+        ranges.append((start, len(new_values)))
+    return ranges
@@ -1,80 +1,309 @@
+import array
+import bisect
 import math
-from PySide2 import QtCore, QtGui
-from curvedeformereditor.drawing import (
-    clamp_point_in_rect, create_beziercurve_path)
+import multiprocessing
+import struct
+from multiprocessing.pool import ThreadPool
+try:
+    import numpy
+except ImportError:
+    # numpy isn't shipped with every maya version, the batch evaluation fall
+    # back on the pure python evaluator.
+    numpy = None
 from curvedeformereditor.trigonometry import (
-    distance, compute_angle, point_on_circle, move_point_from_resized_rect)
-from curvedeformereditor.arrayutils import split_value, clamp, get_break_indices
+    distance, compute_angle, point_on_circle, clamp_point_in_rect, Point,
+    Rect)
+from curvedeformereditor.arrayutils import (
+    split_value, split_value_array, clamp, get_break_indices)
+from curvedeformereditor.fitting import fit_values
+
+
+# Layout of the coordinates stored per control point in a ControlPointBuffer.
+CENTER, TANGENTIN, TANGENTOUT = 0, 2, 4
+COORDINATES_COUNT = 6
+# Control point flags bits.
+BOUNDARY, AUTOTANGENT, SELECTED, LINEAR = 1, 2, 4, 8
+DEFAULT_FLAGS = AUTOTANGENT
+# The control points are stored in a normalized space independent from the
+# widget size: x goes from 0 (first value) to 1 (last value) and y from 0
+# (value 1.0) to 1 (value 0.0). The widget maps it to its pixels to draw.
+CURVE_RECT = Rect(0, 0, 1, 1)
+# Maximum number of threads sharing the numpy evaluation of a batch of
+# samples by default, see compute_bezier_curve_values_batch.
+MAXIMUM_SAMPLING_THREADS = 4
+# Minimum number of values in a batch to split it between the threads. The
+# smaller batches are faster in one pass than the threads synchronization.
+# The editor batches, one sample per distinct cv count of the selected
+# curves, usually stay below and are evaluated serially.
+PARALLEL_SAMPLING_MINIMUM = 20000
+
+
+class ControlPointBuffer():
+    """
+    Contiguous storage of control points. The coordinates are stored as six
+    doubles per control point: center, tangent in and tangent out x and y.
+    The flags are stored as one byte per control point.
+    """
+    def __init__(self, coordinates=None, flags=None):
+        self.coordinates = array.array('d', coordinates or [])
+        self.flags = array.array('B', flags or [])
+
+    def __len__(self):
+        return len(self.flags)
 
+    def allocate(self, coordinates, flags=DEFAULT_FLAGS):
+        self.coordinates.extend(coordinates)
+        self.flags.append(flags)
+        return len(self.flags) - 1
 
-class ControlPoint():
-    def __init__(self, center, tangentin=None, tangentout=None):
-        self.center = QtCore.QPointF(center)
-        self.tangentin = QtCore.QPointF(tangentin or center)
-        self.tangentout = QtCore.QPointF(tangentout or center)
-        self.isboundary = False
-        self.autotangent = True
-        self.selected = False
-        self.linear = False
+
+class BezierSnapshot():
+    """
+    Immutable copy of a bezier curve. The coordinates and the flags are kept
+    as bytes, the snapshot can be shared by several curves and is copied
+    back to editable control points only when it is edited again.
+    """
+    def __init__(self, controlpoints):
+        buffer = ControlPointBuffer()
+        for controlpoint in controlpoints:
+            flags = controlpoint.buffer.flags[controlpoint.slot] & ~SELECTED
+            buffer.allocate(controlpoint.coordinates(), flags)
+        self.coordinates = array_to_bytes(buffer.coordinates)
+        self.flags = array_to_bytes(buffer.flags)
+
+    def __len__(self):
+        return len(self.flags)
+
+    @property
+    def nbytes(self):
+        return len(self.coordinates) + len(self.flags)
+
+    def controlpoints(self):
+        buffer = ControlPointBuffer()
+        array_from_bytes(buffer.coordinates, self.coordinates)
+        array_from_bytes(buffer.flags, self.flags)
+        controlpoints = create_controlpoint_views(buffer)
+        controlpoints[0].isboundary = True
+        controlpoints[-1].isboundary = True
+        return controlpoints
+
+
+def array_to_bytes(values):
+    # array.tostring is the python 2 name of array.tobytes
+    if hasattr(values, 'tobytes'):
+        return values.tobytes()
+    return values.tostring()
+
+
+def array_from_bytes(values, data):
+    if hasattr(values, 'frombytes'):
+        values.frombytes(data)
+        return
+    values.fromstring(data)
+
+
+class ControlPoint(object):
+    """
+    Lightweight view on a control point stored in a ControlPointBuffer. The
+    center and the tangents are returned as new Point, they have to be
+    assigned to be modified.
+    """
+    __slots__ = 'buffer', 'slot'
+
+    def __init__(
+            self, center, tangentin=None, tangentout=None, buffer=None,
+            slot=None):
+        self.buffer = buffer
+        self.slot = slot
+        if buffer is not None:
+            return
+        tangentin = tangentin or center
+        tangentout = tangentout or center
+        self.buffer = ControlPointBuffer()
+        self.slot = self.buffer.allocate((
+            center.x(), center.y(), tangentin.x(), tangentin.y(),
+            tangentout.x(), tangentout.y()))
+
+    def coordinates(self):
+        """
+        Return the center, tangent in and tangent out coordinates as:
+        (cx, cy, inx, iny, outx, outy)
+        """
+        index = self.slot * COORDINATES_COUNT
+        return self.buffer.coordinates[index:index + COORDINATES_COUNT]
+
+    def _get_point(self, offset):
+        index = self.slot * COORDINATES_COUNT + offset
+        coordinates = self.buffer.coordinates
+        return Point(coordinates[index], coordinates[index + 1])
+
+    def _set_point(self, offset, point):
+        index = self.slot * COORDINATES_COUNT + offset
+        self.buffer.coordinates[index] = point.x()
+        self.buffer.coordinates[index + 1] = point.y()
+
+    def _get_flag(self, flag):
+        return bool(self.buffer.flags[self.slot] & flag)
+
+    def _set_flag(self, flag, state):
+        if state:
+            self.buffer.flags[self.slot] |= flag
+        else:
+            self.buffer.flags[self.slot] &= ~flag & 0xFF
+
+    center = property(
+        lambda self: self._get_point(CENTER),
+        lambda self, point: self._set_point(CENTER, point))
+    tangentin = property(
+        lambda self: self._get_point(TANGENTIN),
+        lambda self, point: self._set_point(TANGENTIN, point))
+    tangentout = property(
+        lambda self: self._get_point(TANGENTOUT),
+        lambda self, point: self._set_point(TANGENTOUT, point))
+    isboundary = property(
+        lambda self: self._get_flag(BOUNDARY),
+        lambda self, state: self._set_flag(BOUNDARY, state))
+    autotangent = property(
+        lambda self: self._get_flag(AUTOTANGENT),
+        lambda self, state: self._set_flag(AUTOTANGENT, state))
+    selected = property(
+        lambda self: self._get_flag(SELECTED),
+        lambda self, state: self._set_flag(SELECTED, state))
+    linear = property(
+        lambda self: self._get_flag(LINEAR),
+        lambda self, state: self._set_flag(LINEAR, state))
 
     def move(self, point, rect=None):
+        index = self.slot * COORDINATES_COUNT
+        coordinates = self.buffer.coordinates
         if self.isboundary is True:
-            point.setX(self.center.x())
+            point.setX(coordinates[index])
         if rect is not None:
             clamp_point_in_rect(point, rect)
 
-        delta = self.center - point
-        self.center -= delta
-        self.tangentin -= delta
-        self.tangentout -= delta
+        delta_x = point.x() - coordinates[index]
+        delta_y = point.y() - coordinates[index + 1]
+        for i in range(index, index + COORDINATES_COUNT, 2):
+            coordinates[i] += delta_x
+            coordinates[i + 1] += delta_y
 
     def move_tangent(self, point1, point2=None):
-        if point1.x() < self.center.x():
-            parent = self.tangentin
-            child = self.tangentout
+        center = self.center
+        if point1.x() < center.x():
+            parent, child = TANGENTIN, TANGENTOUT
         else:
-            parent = self.tangentout
-            child = self.tangentin
-
-        parent.setX(point1.x())
-        parent.setY(point1.y())
-        mirror = point2 or compute_mirror_tangent(self.center, parent, child)
-        child.setX(mirror.x())
-        child.setY(mirror.y())
+            parent, child = TANGENTOUT, TANGENTIN
 
-    def resize(self, old_size, new_size):
-        move_point_from_resized_rect(self.center, old_size, new_size)
-        move_point_from_resized_rect(self.tangentin, old_size, new_size)
-        move_point_from_resized_rect(self.tangentout, old_size, new_size)
+        self._set_point(parent, point1)
+        mirror = point2 or compute_mirror_tangent(
+            center, Point(point1.x(), point1.y()), self._get_point(child))
+        self._set_point(child, mirror)
 
     def __lt__(self, controlpoint):
-        return self.center.x() < controlpoint.center.x()
+        return (
+            self.buffer.coordinates[self.slot * COORDINATES_COUNT] <
+            controlpoint.buffer.coordinates[
+                controlpoint.slot * COORDINATES_COUNT])
 
 
-def insert_controlpoint_in_curve(point, controlpoints):
-    controlpoints = sorted(controlpoints)
-    for controlpoint in controlpoints[1:]:
-        if controlpoint.center.x() > point.x():
-            break
-    controlpoint = ControlPoint(point, QtCore.QPoint(), QtCore.QPoint())
-    return controlpoint
-
-
-def pick_controlpoint_center(controlpoints, point, tolerance=8):
-    for controlpoint in controlpoints:
-        if distance(controlpoint.center, point) < tolerance:
-            return controlpoint
-    return None
-
-
-def pick_controlpoint_tangent(controlpoints, point, tolerance=8):
-    for controlpoint in controlpoints:
-        condition = (
-            distance(controlpoint.tangentin, point) < tolerance or
-            distance(controlpoint.tangentout, point) < tolerance)
-        if condition:
-            return controlpoint
-    return None
+class ControlPointIndex():
+    """
+    Index of the control points centers and tangents sorted along x. It
+    answers the picking queries in O(log n + k) where k is the number of
+    points in the tolerance band. It has to be updated every time a control
+    point is added, moved or removed.
+    The queried points and distances are given in the view space, the scale
+    maps the control points space to it.
+    """
+    OFFSETS = CENTER, TANGENTIN, TANGENTOUT
+
+    def __init__(self, controlpoints=None, scale=(1.0, 1.0)):
+        self.scale = scale
+        self.xs = []
+        self.entries = []
+        # {id(controlpoint): x of center, tangent in and tangent out indexed}
+        self.indexed = {}
+        for controlpoint in controlpoints or []:
+            self.add(controlpoint)
+
+    def __len__(self):
+        return len(self.indexed)
+
+    def add(self, controlpoint):
+        coordinates = controlpoint.coordinates()
+        xs = tuple(coordinates[offset] for offset in self.OFFSETS)
+        for offset, x in zip(self.OFFSETS, xs):
+            index = bisect.bisect_right(self.xs, x)
+            self.xs.insert(index, x)
+            self.entries.insert(index, (controlpoint, offset))
+        self.indexed[id(controlpoint)] = xs
+
+    def remove(self, controlpoint):
+        xs = self.indexed.pop(id(controlpoint), None)
+        if xs is None:
+            return
+        for offset, x in zip(self.OFFSETS, xs):
+            index = bisect.bisect_left(self.xs, x)
+            while self.entries[index] != (controlpoint, offset):
+                index += 1
+            del self.xs[index]
+            del self.entries[index]
+
+    def update(self, controlpoints):
+        for controlpoint in controlpoints:
+            self.remove(controlpoint)
+            self.add(controlpoint)
+
+    def pick(self, point, tolerance=8, offsets=OFFSETS):
+        """
+        Return the control point which has the nearest of the given offsets
+        (CENTER, TANGENTIN, TANGENTOUT) from the point within the tolerance.
+        """
+        scale_x, scale_y = self.scale
+        x, y = point.x() / scale_x, point.y() / scale_y
+        start = bisect.bisect_left(self.xs, x - tolerance / scale_x)
+        end = bisect.bisect_right(self.xs, x + tolerance / scale_x)
+        picked = None
+        nearest = tolerance
+        for i in range(start, end):
+            controlpoint, offset = self.entries[i]
+            if offset not in offsets:
+                continue
+            index = controlpoint.slot * COORDINATES_COUNT + offset + 1
+            y_distance = (controlpoint.buffer.coordinates[index] - y) * scale_y
+            point_distance = math.hypot((self.xs[i] - x) * scale_x, y_distance)
+            if point_distance < nearest:
+                picked = controlpoint
+                nearest = point_distance
+        return picked
+
+    def around(self, point, radius, offsets=(CENTER, )):
+        """
+        Return the control points which have one of the given offsets within
+        the radius of the point.
+        """
+        scale_x, scale_y = self.scale
+        x, y = point.x() / scale_x, point.y() / scale_y
+        start = bisect.bisect_left(self.xs, x - radius / scale_x)
+        end = bisect.bisect_right(self.xs, x + radius / scale_x)
+        controlpoints = []
+        found = set()
+        for i in range(start, end):
+            controlpoint, offset = self.entries[i]
+            if offset not in offsets or id(controlpoint) in found:
+                continue
+            index = controlpoint.slot * COORDINATES_COUNT + offset + 1
+            y_distance = (controlpoint.buffer.coordinates[index] - y) * scale_y
+            if math.hypot((self.xs[i] - x) * scale_x, y_distance) <= radius:
+                controlpoints.append(controlpoint)
+                found.add(id(controlpoint))
+        return controlpoints
+
+    def pick_center(self, point, tolerance=8):
+        return self.pick(point, tolerance, (CENTER, ))
+
+    def pick_tangent(self, point, tolerance=8):
+        return self.pick(point, tolerance, (TANGENTIN, TANGENTOUT))
 
 
 def compute_mirror_tangent(center, tangent, child=None):
@@ -89,24 +318,90 @@ def auto_tangent_beziercurve(
     This apply the good autotangent function on every controlpoint on a bezier
     curve.
     """
-    auto_tangent_function = auto_tangent_function or auto_tangent_smoothed
     controlpoints = sorted(controlpoints)
     for i, controlpoint in enumerate(controlpoints):
         if controlpoint is skip:
             continue
-        if controlpoint.autotangent is False:
-            continue
-        if i == 0:
-            auto_tangent_boundary_controlpoint(
-                controlpoint, controlpoints[i + 1])
-            continue
-        if i == len(controlpoints) - 1:
-            auto_tangent_boundary_controlpoint(
-                controlpoint, controlpoints[i - 1])
+        auto_tangent_controlpoint(controlpoints, i, auto_tangent_function)
+
+
+def auto_tangent_controlpoint(
+        controlpoints, index, auto_tangent_function=None):
+    """
+    This apply the good autotangent function on the controlpoint at the given
+    index of a sorted bezier curve.
+    """
+    auto_tangent_function = auto_tangent_function or auto_tangent_smoothed
+    controlpoint = controlpoints[index]
+    if controlpoint.autotangent is False or len(controlpoints) < 2:
+        return
+    if index == 0:
+        auto_tangent_boundary_controlpoint(controlpoint, controlpoints[1])
+        return
+    if index == len(controlpoints) - 1:
+        auto_tangent_boundary_controlpoint(
+            controlpoint, controlpoints[index - 1])
+        return
+    before = controlpoints[index - 1]
+    after = controlpoints[index + 1]
+    auto_tangent_function(controlpoint, before, after)
+
+
+def auto_tangent_neighbourhood(
+        controlpoints, first, last=None, skip=None,
+        auto_tangent_function=None):
+    """
+    This apply the autotangent only on the controlpoints between the first
+    and the last index of a sorted bezier curve and their direct neighbours.
+    This is the only part of the curve affected by an edit on those
+    controlpoints.
+    """
+    last = first if last is None else last
+    start = max(0, first - 1)
+    end = min(len(controlpoints), last + 2)
+    for i in range(start, end):
+        if controlpoints[i] is skip:
             continue
-        before = controlpoints[i - 1]
-        after = controlpoints[i + 1]
-        auto_tangent_function(controlpoint, before, after)
+        auto_tangent_controlpoint(controlpoints, i, auto_tangent_function)
+
+
+def find_controlpoint_index(controlpoints, controlpoint):
+    """
+    This function return the index of a controlpoint in a sorted bezier curve
+    using a binary search.
+    """
+    index = bisect.bisect_left(controlpoints, controlpoint)
+    for i in range(index, len(controlpoints)):
+        if controlpoints[i] is controlpoint:
+            return i
+    return controlpoints.index(controlpoint)
+
+
+def insert_controlpoint_sorted(controlpoints, controlpoint):
+    """
+    This function insert a controlpoint in a sorted bezier curve and return
+    its index.
+    """
+    index = bisect.bisect_right(controlpoints, controlpoint)
+    controlpoints.insert(index, controlpoint)
+    return index
+
+
+def reorder_controlpoint(controlpoints, index):
+    """
+    After a controlpoint move, this function swap it with its neighbours
+    until the bezier curve is sorted again and return its new index.
+    """
+    while index > 0 and controlpoints[index] < controlpoints[index - 1]:
+        controlpoints[index - 1], controlpoints[index] = (
+            controlpoints[index], controlpoints[index - 1])
+        index -= 1
+    last = len(controlpoints) - 1
+    while index < last and controlpoints[index + 1] < controlpoints[index]:
+        controlpoints[index + 1], controlpoints[index] = (
+            controlpoints[index], controlpoints[index + 1])
+        index += 1
+    return index
 
 
 def auto_tangent_boundary_controlpoint(controlpoint, target):
@@ -182,81 +477,365 @@ def auto_tangent_flatten(controlpoint, before, after):
     controlpoint.move_tangent(tangent1, tangent2)
 
 
-def vertical_path(rect, x):
+def get_bezier_segments(controlpoints):
     """
-    This function create a super tiny vertical rectangle on the x coordinate.
-    This is use to find a Y coordinate with X coordinate given on a bezier
-    curve.
+    This function return the cubic segments drawn by a bezier curve as tuples
+    of four (x, y) tuples: start, tangent out, tangent in and end.
+    It follow the same rules than drawing.create_beziercurve_path: a linear
+    control point ignore its tangents and draw a straight line from the
+    previous one.
     """
-    point1 = QtCore.QPointF(x, rect.top() - 1e10)
-    point2 = QtCore.QPointF(x, rect.bottom() + 1e10)
-    point3 = QtCore.QPointF(x + 1e-5, rect.bottom() + 1e10)
-    point4 = QtCore.QPointF(x + 1e-5, rect.top() - 1e10)
-    path = QtGui.QPainterPath(point1)
-    path.lineTo(point2)
-    path.lineTo(point3)
-    path.lineTo(point4)
-    return path
+    controlpoints = sorted(controlpoints)
+    return [
+        get_bezier_segment(before, after)
+        for before, after in zip(controlpoints[:-1], controlpoints[1:])]
 
 
-def compute_bezier_curve_values(controlpoints, rect, sample):
+def get_bezier_segment(before, after):
+    """
+    This function return the cubic segment drawn between two consecutive
+    control points, see get_bezier_segments.
     """
-    This function compute the values drawn by an horizontal bezier curve as
-    QPainterPath. Sample give the number of samples are requested.
+    start_x, start_y, _, _, out_x, out_y = before.coordinates()
+    end_x, end_y, in_x, in_y, _, _ = after.coordinates()
+    start = start_x, start_y
+    end = end_x, end_y
+    if after.linear is True:
+        return start, end, end, end
+    if before.linear is True:
+        out = start
+    else:
+        out = clamp_tangent(start, (out_x, out_y), end_x)
+    return start, out, clamp_tangent(end, (in_x, in_y), start_x), end
+
+
+def clamp_tangent(center, tangent, limit):
+    """
+    This function shorten the tangent along its direction to keep its x
+    between the center and the x limit of the segment. A tangent going
+    backward is collapsed on the center. With both tangents inside the
+    segment, x(t) is monotonic and every x has only one value on the curve.
+    """
+    center_x, center_y = center
+    tangent_x, tangent_y = tangent
+    width = limit - center_x
+    offset = tangent_x - center_x
+    if offset * width < 0 or (width == 0 and offset != 0):
+        return center
+    if abs(offset) <= abs(width):
+        return tangent
+    ratio = width / offset
+    return center_x + offset * ratio, center_y + (tangent_y - center_y) * ratio
+
+
+def compute_cubic_coefficients(p0, p1, p2, p3):
+    """
+    This function convert the four bezier control values of one dimension in
+    the polynomial coefficients a, b, c, d where:
+    value(t) = a * t**3 + b * t**2 + c * t + d
+    """
+    return (
+        p3 - 3 * p2 + 3 * p1 - p0,
+        3 * p2 - 6 * p1 + 3 * p0,
+        3 * p1 - 3 * p0,
+        p0)
+
+
+def evaluate_cubic(coefficients, t):
+    a, b, c, d = coefficients
+    return ((a * t + b) * t + c) * t + d
+
+
+def solve_cubic_parameter(coefficients, value, tolerance=1e-10):
+    """
+    This function find the parameter t in [0, 1] where the cubic polynomial
+    is equal to the given value. It starts with a few Newton iterations from
+    a linear guess and fall back on a bisection if Newton doesn't converge.
+    """
+    a, b, c, _ = coefficients
+    start = evaluate_cubic(coefficients, 0)
+    end = evaluate_cubic(coefficients, 1)
+    if value <= min(start, end):
+        return 0.0 if start <= end else 1.0
+    if value >= max(start, end):
+        return 1.0 if start <= end else 0.0
+
+    t = (value - start) / (end - start)
+    for _ in range(8):
+        error = evaluate_cubic(coefficients, t) - value
+        if abs(error) < tolerance:
+            return t
+        derivative = (3 * a * t + 2 * b) * t + c
+        if abs(derivative) < 1e-12:
+            break
+        t -= error / derivative
+        if t < 0 or t > 1:
+            break
+
+    ascending = end >= start
+    low, high = 0.0, 1.0
+    for _ in range(64):
+        t = (low + high) / 2
+        evaluated = evaluate_cubic(coefficients, t)
+        if abs(evaluated - value) < tolerance:
+            return t
+        if (evaluated < value) is ascending:
+            low = t
+        else:
+            high = t
+    return t
+
+
+def compute_bezier_curve_values(controlpoints, sample, segments=None):
+    """
+    This function compute the values drawn by an horizontal bezier curve.
+    Sample give the number of samples are requested.
     The result is a list of floats. 0.0 is the smallest visible value and
     1.0 is the highest visible value but higher and lower values can be
-    returned if the bezier curve is out of rect on sample.
+    returned if the bezier curve is out of CURVE_RECT on sample.
+    The segments of the curve can be given if they are already computed.
     """
     if sample < 2:
         raise ValueError("At least 2 values can be requested (start and end)")
-    # WORKAROUND: if the control points draw a straight line path,
-    # for a strange reason, the intersection algorytm fail ...
-    # To avoid this issue, if the bezier curve contains only two control point,
-    # a third one is created in the middle with a tiny offset to break the line
-    if len(controlpoints) == 2:
-        x = (controlpoints[0].center.x() + controlpoints[-1].center.x()) / 2
-        y = (controlpoints[0].center.y() + controlpoints[-1].center.y()) / 2
-        y += 1e-3
-        controlpoint = ControlPoint(QtCore.QPointF(x, y))
-        controlpoints.insert(1, controlpoint)
+    segments = segments or get_bezier_segments(controlpoints)
     # To find an y coordinate on a horizontal bezier curve from a x coordinate
-    # given, we create a vertical really thin rectanglular QPainterPath.
-    # Use the QPainterPath.intersected() return a QPainterPath which start
-    # exactly on the intersection.
-    path = create_beziercurve_path(controlpoints)
-    lines = [vertical_path(rect, x) for x in split_value(rect.width(), sample)]
-    intersections = [path.intersected(line) for line in lines]
-    points = [intersection.pointAtPercent(1) for intersection in intersections]
-    values = [1 - (point.y() / rect.height()) for point in points]
-    # the first and the last values are not all the time well evaluate with the
-    # intersection method, so we compute them separately.
-    values[0] = 1 - controlpoints[0].center.y() / rect.height()
-    values[-1] = 1 - controlpoints[-1].center.y() / rect.height()
+    # given, the x(t) polynomial of the segment containing the x is solved
+    # and the y(t) polynomial is evaluated with the result.
+    segments = [
+        (compute_cubic_coefficients(*[point[0] for point in segment]),
+         compute_cubic_coefficients(*[point[1] for point in segment]),
+         segment[-1][0])
+        for segment in segments]
+    values = []
+    # The samples and the segments are both sorted along x, the segments are
+    # walked once.
+    index = 0
+    for x in split_value(1.0, sample):
+        while index < len(segments) - 1 and segments[index][2] < x:
+            index += 1
+        x_coefficients, y_coefficients, _ = segments[index]
+        t = solve_cubic_parameter(x_coefficients, x)
+        y = evaluate_cubic(y_coefficients, t)
+        values.append(1 - y)
+    # the first and the last values are evaluated on the boundaries control
+    # points to not depend on the solver precision.
+    controlpoints = sorted(controlpoints)
+    values[0] = 1 - controlpoints[0].center.y()
+    values[-1] = 1 - controlpoints[-1].center.y()
     return values
 
 
-def create_beziercurve(values, rect, linear=False):
-    """ TODO: docstring """
-    x_pos = split_value(rect.width(), len(values))
-    y_pos = [rect.height() * (1 - value) for value in values]
-    breakpoints_indices = get_break_indices(values)
-    controlpoints = []
+def compute_bezier_curve_values_batch(
+        controlpoints, samples, segments=None, threads=None):
+    """
+    This function compute the values drawn by an horizontal bezier curve for
+    several sample counts at once. It returns a dictionnary with every
+    distinct sample count as key and the list of values as value.
+    With numpy available, all the samples of all the counts are evaluated in
+    one vectorized pass. The large batches are split in contiguous chunks
+    evaluated by a pool of threads, numpy releases the GIL during the
+    evaluation. The chunks are gathered in order, the values are the same
+    as the serial evaluation. threads default on
+    get_default_sampling_threads.
+    """
+    samples = sorted(set(samples))
+    if not samples:
+        return {}
+    if samples[0] < 2:
+        raise ValueError("At least 2 values can be requested (start and end)")
+    segments = segments or get_bezier_segments(controlpoints)
+    if numpy is None:
+        return {
+            sample: compute_bezier_curve_values(
+                controlpoints, sample, segments)
+            for sample in samples}
+
+    segments = numpy.array(segments, dtype=float)
+    # shape: (segments count, 4 coefficients)
+    x_coefficients = numpy.array(compute_cubic_coefficients(
+        *[segments[:, i, 0] for i in range(4)])).T
+    y_coefficients = numpy.array(compute_cubic_coefficients(
+        *[segments[:, i, 1] for i in range(4)])).T
+
+    xs = numpy.concatenate([
+        split_value_array(1.0, sample) for sample in samples])
+    ends = segments[:-1, 3, 0]
+
+    def evaluate(xs):
+        indices = numpy.searchsorted(ends, xs, side='left')
+        t = solve_cubic_parameter_array(x_coefficients[indices], xs)
+        return 1 - evaluate_cubic_array(y_coefficients[indices], t)
+
+    if len(xs) < PARALLEL_SAMPLING_MINIMUM:
+        threads = 1
+    elif threads is None:
+        threads = get_default_sampling_threads()
+    if threads > 1:
+        pool = get_sampling_pool(threads)
+        values = numpy.concatenate(
+            pool.map(evaluate, numpy.array_split(xs, threads)))
+    else:
+        values = evaluate(xs)
+
+    controlpoints = sorted(controlpoints)
+    first = 1 - controlpoints[0].center.y()
+    last = 1 - controlpoints[-1].center.y()
+    result = {}
+    offset = 0
+    for sample in samples:
+        sampled = values[offset:offset + sample].tolist()
+        sampled[0], sampled[-1] = first, last
+        result[sample] = sampled
+        offset += sample
+    return result
+
+
+_sampling_pools = {}
+
+
+def get_default_sampling_threads():
+    return min(MAXIMUM_SAMPLING_THREADS, multiprocessing.cpu_count())
+
+
+def get_sampling_pool(threads):
+    """
+    This function return a pool of threads shared by the batch evaluations.
+    It's created on first use and kept alive until close_sampling_pools.
+    """
+    pool = _sampling_pools.get(threads)
+    if pool is None:
+        pool = ThreadPool(threads)
+        _sampling_pools[threads] = pool
+    return pool
+
+
+def close_sampling_pools():
+    """
+    This function stop the threads of the sampling pools. They are created
+    again by the next parallel evaluation.
+    """
+    for pool in _sampling_pools.values():
+        pool.close()
+        pool.join()
+    _sampling_pools.clear()
+
+
+def evaluate_cubic_array(coefficients, t):
+    a, b, c, d = coefficients.T
+    return ((a * t + b) * t + c) * t + d
+
+
+def solve_cubic_parameter_array(coefficients, values, iterations=24):
+    """
+    Vectorized version of solve_cubic_parameter. Every row of the
+    coefficients is solved with its value using a Newton iteration kept
+    inside a bisection bracket.
+    """
+    a, b, c, _ = coefficients.T
+    start = evaluate_cubic_array(coefficients, 0.0)
+    end = evaluate_cubic_array(coefficients, 1.0)
+    ascending = end >= start
+    span = numpy.where(end == start, 1.0, end - start)
+    t = numpy.clip((values - start) / span, 0.0, 1.0)
+    low = numpy.zeros_like(t)
+    high = numpy.ones_like(t)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        for _ in range(iterations):
+            error = evaluate_cubic_array(coefficients, t) - values
+            below = (error < 0) == ascending
+            low = numpy.where(below, t, low)
+            high = numpy.where(below, high, t)
+            derivative = (3 * a * t + 2 * b) * t + c
+            newton = t - error / derivative
+            outside = (
+                ~numpy.isfinite(newton) | (newton <= low) | (newton >= high))
+            t = numpy.where(outside, (low + high) / 2, newton)
+    return t
+
+
+def create_beziercurve(values, linear=False, tolerance=None):
+    """
+    This function create the control points of a bezier curve drawing the
+    values in CURVE_RECT. The control points are placed on the values which
+    are not a linear interpolation of their neighbours.
+    If a tolerance is given, the values are approximated by smooth control
+    points within the tolerance instead, unless the curve placed on the
+    values breaks is within the tolerance as well with less control points.
+    """
+    x_pos = split_value(1.0, len(values))
+    y_pos = [1 - value for value in values]
+    controlpoints = create_breakpoints_controlpoints(x_pos, y_pos, linear)
+    if tolerance is None:
+        return controlpoints
+    fitted = fit_values(values, tolerance)
+    if fitted is None:
+        return controlpoints
+    knots, slopes = fitted
+    if (len(controlpoints) < len(knots) and
+            get_maximum_error(controlpoints, values) <= tolerance):
+        return controlpoints
+    buffer = ControlPointBuffer()
+    allocate_fitted_controlpoints(buffer, x_pos, y_pos, knots, slopes)
+    return pin_boundaries(create_controlpoint_views(buffer))
+
+
+def create_breakpoints_controlpoints(x_pos, y_pos, linear=False):
+    breakpoints_indices = set(get_break_indices(y_pos))
+    buffer = ControlPointBuffer()
+    flags = DEFAULT_FLAGS | LINEAR if linear is True else DEFAULT_FLAGS
     for i, (x, y) in enumerate(zip(x_pos, y_pos)):
         if i not in breakpoints_indices:
             continue
-        controlpoint = ControlPoint(QtCore.QPointF(x, y))
-        controlpoint.linear = linear
-        controlpoints.append(controlpoint)
+        buffer.allocate((x, y) * 3, flags)
+    controlpoints = create_controlpoint_views(buffer)
     if linear is False:
         auto_tangent_beziercurve(controlpoints)
-    # some offset can appear after resizing the widget which cause some
-    # issues on the limits control point. This ensure that the first
-    # and the last point has the right x value
-    controlpoints[0].center.setX(rect.left())
-    controlpoints[-1].center.setX(rect.right())
+    return pin_boundaries(controlpoints)
+
+
+def pin_boundaries(controlpoints):
+    # the float division of split_value can leave the last x slightly before
+    # the right side, the boundaries are pinned to the rect sides.
+    controlpoints[0].center = Point(
+        CURVE_RECT.left(), controlpoints[0].center.y())
+    controlpoints[-1].center = Point(
+        CURVE_RECT.right(), controlpoints[-1].center.y())
     return controlpoints
 
 
+def get_maximum_error(controlpoints, values):
+    """
+    This function return the largest difference between the values and the
+    curve sampled at their positions.
+    """
+    sampled = compute_bezier_curve_values(controlpoints, len(values))
+    return max(abs(a - b) for a, b in zip(sampled, values))
+
+
+def allocate_fitted_controlpoints(buffer, x_pos, y_pos, knots, slopes):
+    """
+    This function allocate the control points of a curve fitted by
+    fitting.fit_values. They start with the fitted tangents and get auto
+    tangents like the other control points once they are edited.
+    """
+    for j, (index, slope) in enumerate(zip(knots, slopes)):
+        x, y = x_pos[index], y_pos[index]
+        before = x - x_pos[knots[max(0, j - 1)]]
+        after = x_pos[knots[min(len(knots) - 1, j + 1)]] - x
+        # the boundaries tangents outside of the curve are mirrored.
+        before = before or after
+        after = after or before
+        # the slopes are fitted with the values growing upward, y downward.
+        tangentin = x - before / 3.0, y + slope * before / 3.0
+        tangentout = x + after / 3.0, y - slope * after / 3.0
+        buffer.allocate((x, y) + tangentin + tangentout, DEFAULT_FLAGS)
+
+
+def create_controlpoint_views(buffer):
+    return [
+        ControlPoint(None, buffer=buffer, slot=i) for i in range(len(buffer))]
+
+
 def select_controlpoint(selected_controlpoint, controlpoints):
     for controlpoint in controlpoints:
         controlpoint.selected = False
@@ -264,12 +843,166 @@ def select_controlpoint(selected_controlpoint, controlpoints):
 
 
 def copy_bezier_curve(controlpoints):
-    bezier = []
+    """
+    This function copy the control points in one new contiguous buffer.
+    The selection isn't copied.
+    """
+    buffer = ControlPointBuffer()
     for controlpoint in controlpoints:
-        bezier.append(ControlPoint(
-            center=QtCore.QPointF(controlpoint.center),
-            tangentin=QtCore.QPointF(controlpoint.tangentin),
-            tangentout=QtCore.QPointF(controlpoint.tangentout)))
+        flags = controlpoint.buffer.flags[controlpoint.slot] & ~SELECTED
+        buffer.allocate(controlpoint.coordinates(), flags)
+    bezier = create_controlpoint_views(buffer)
     bezier[0].isboundary = True
     bezier[-1].isboundary = True
     return bezier
+
+
+# Version of the data written by serialize_beziercurve.
+SERIALIZATION_VERSION = 1
+
+
+# Header of the bytes written by encode_beziercurve: magic, version and
+# control points count, followed by the little endian coordinates and flags.
+ENCODING_HEADER = struct.Struct('<3sBI')
+ENCODING_MAGIC = b'BZC'
+ENCODING_VERSION = 1
+
+
+def flatten_beziercurve(controlpoints):
+    """
+    This function return the coordinates and the flags of the control points
+    sorted along x as two flat lists. The selection isn't kept.
+    """
+    coordinates = []
+    flags = []
+    for controlpoint in sorted(controlpoints):
+        coordinates.extend(controlpoint.coordinates())
+        flags.append(controlpoint.buffer.flags[controlpoint.slot] & ~SELECTED)
+    return coordinates, flags
+
+
+def serialize_beziercurve(controlpoints):
+    """
+    This function return the control points as a json compatible dictionnary.
+    The selection isn't serialized.
+    """
+    coordinates, flags = flatten_beziercurve(controlpoints)
+    return {
+        'version': SERIALIZATION_VERSION,
+        'coordinates': coordinates,
+        'flags': flags}
+
+
+def deserialize_beziercurve(data):
+    """
+    This function create the control points serialized by
+    serialize_beziercurve in one new contiguous buffer.
+    """
+    if data.get('version') != SERIALIZATION_VERSION:
+        raise ValueError(
+            'Unsupported bezier curve version: {}'.format(data.get('version')))
+    if len(data['coordinates']) != len(data['flags']) * COORDINATES_COUNT:
+        raise ValueError('Invalid bezier curve data')
+    buffer = ControlPointBuffer(data['coordinates'], data['flags'])
+    bezier = create_controlpoint_views(buffer)
+    if bezier:
+        bezier[0].isboundary = True
+        bezier[-1].isboundary = True
+    return bezier
+
+
+def encode_beziercurve(controlpoints):
+    """
+    This function return the control points as compact bytes, independent
+    of the platform byte order. The selection isn't encoded.
+    """
+    coordinates, flags = flatten_beziercurve(controlpoints)
+    count = len(flags)
+    return (
+        ENCODING_HEADER.pack(ENCODING_MAGIC, ENCODING_VERSION, count) +
+        struct.pack('<{}d'.format(count * COORDINATES_COUNT), *coordinates) +
+        struct.pack('<{}B'.format(count), *flags))
+
+
+def decode_beziercurve(data):
+    """
+    This function create the control points encoded by encode_beziercurve in
+    one new contiguous buffer.
+    """
+    try:
+        magic, version, count = ENCODING_HEADER.unpack_from(data)
+    except struct.error:
+        raise ValueError('Invalid bezier curve data')
+    if magic != ENCODING_MAGIC:
+        raise ValueError('Invalid bezier curve data')
+    if version != ENCODING_VERSION:
+        raise ValueError(
+            'Unsupported bezier curve version: {}'.format(version))
+    coordinates_format = '<{}d'.format(count * COORDINATES_COUNT)
+    flags_format = '<{}B'.format(count)
+    offset = ENCODING_HEADER.size
+    size = offset + struct.calcsize(coordinates_format) + count
+    if len(data) != size:
+        raise ValueError('Invalid bezier curve data')
+    coordinates = struct.unpack_from(coordinates_format, data, offset)
+    offset += struct.calcsize(coordinates_format)
+    flags = struct.unpack_from(flags_format, data, offset)
+    buffer = ControlPointBuffer(coordinates, flags)
+    bezier = create_controlpoint_views(buffer)
+    if bezier:
+        bezier[0].isboundary = True
+        bezier[-1].isboundary = True
+    return bezier
+
+
+class BezierCurve():
+    """
+    Bezier curve drawing a weights profile in CURVE_RECT. It doesn't need Qt
+    and can be used without GUI to evaluate weights, e.g. in batch jobs.
+    The BezierEqualizer widget edits one of them. The control points list is
+    kept sorted along x.
+    """
+
+    def __init__(self, controlpoints=None):
+        self.controlpoints = controlpoints if controlpoints is not None else []
+
+    def __len__(self):
+        return len(self.controlpoints)
+
+    @classmethod
+    def from_values(cls, values, linear=False, tolerance=None):
+        if len(values) < 2:
+            raise ValueError('At least 2 values has to be provided')
+        controlpoints = create_beziercurve(values, linear, tolerance)
+        controlpoints[0].isboundary = True
+        controlpoints[-1].isboundary = True
+        return cls(controlpoints)
+
+    @classmethod
+    def from_data(cls, data):
+        return cls(deserialize_beziercurve(data))
+
+    @classmethod
+    def from_bytes(cls, data):
+        return cls(decode_beziercurve(data))
+
+    def data(self):
+        return serialize_beziercurve(self.controlpoints)
+
+    def to_bytes(self):
+        return encode_beziercurve(self.controlpoints)
+
+    def copy(self):
+        return BezierCurve(copy_bezier_curve(self.controlpoints))
+
+    def values(self, sample, segments=None):
+        return compute_bezier_curve_values(
+            self.controlpoints, sample, segments)
+
+    def values_per_sample(self, samples, segments=None, threads=None):
+        return compute_bezier_curve_values_batch(
+            self.controlpoints, samples, segments, threads)
+
+    def auto_tangent(self, auto_tangent_function=None):
+        auto_tangent_beziercurve(
+            self.controlpoints, auto_tangent_function=auto_tangent_function)
@@ -1,13 +1,80 @@
 import math
 from PySide2 import QtWidgets, QtCore, QtGui
 from curvedeformereditor.drawing import (
-    draw_background, draw_bezierpath, draw_controlpoint, draw_grid, COLORS,
-    grow_rect, create_beziercurve_path, draw_bezierbody)
+    draw_background, draw_bezierpath, draw_controlpoints, draw_grid, COLORS,
+    grow_rect, create_beziercurve_path, create_beziercurve_body,
+    draw_bezierbody,
+    get_controlpoints_bounding_rect, get_beziercurve_path_elements_count,
+    update_beziercurve_path)
 from curvedeformereditor.beziercurve import (
-    pick_controlpoint_center, auto_tangent_smoothed, auto_tangent_beziercurve,
-    pick_controlpoint_tangent, insert_controlpoint_in_curve,
-    select_controlpoint, auto_tangent_flatten, create_beziercurve,
-    compute_bezier_curve_values)
+    auto_tangent_smoothed, ControlPoint, select_controlpoint,
+    auto_tangent_flatten, BezierCurve,
+    auto_tangent_neighbourhood, find_controlpoint_index,
+    insert_controlpoint_sorted, reorder_controlpoint, ControlPointIndex,
+    get_bezier_segment, CURVE_RECT)
+
+
+# Margin in pixels around the edited control points and segments repainted,
+# it covers the handles size and the curve border width.
+DIRTY_MARGIN = 12
+# Above this count of control points per horizontal pixel, the tangents are
+# only drawn for the selected control points and the ones near the cursor.
+LOD_DENSITY = 0.05
+LOD_HOVER_RADIUS = 60
+
+
+class BezierPathCache():
+    """
+    This class keep the painter paths of the bezier curve and its body and
+    the cubic segments used to sample it for a given curve revision. The
+    edited control points indices are collected between two refreshes to
+    only rebuild their segments.
+    """
+
+    def __init__(self):
+        self.revision = None
+        self.path = None
+        self.body = None
+        self.segments = []
+        self.indices = set()
+        self.rebuild = True
+
+    def invalidate(self, indices=None):
+        if indices is None:
+            self.rebuild = True
+            return
+        self.indices.update(indices)
+
+    def refresh(self, controlpoints, revision):
+        if revision == self.revision:
+            return
+        count = len(controlpoints)
+        rebuild = (
+            self.rebuild or
+            len(self.segments) != max(0, count - 1) or
+            self.path.elementCount() !=
+            get_beziercurve_path_elements_count(controlpoints))
+        if rebuild:
+            self.path = create_beziercurve_path(controlpoints)
+            self.segments = [
+                get_bezier_segment(controlpoints[i], controlpoints[i + 1])
+                for i in range(count - 1)]
+        else:
+            indices = [i for i in self.indices if 0 <= i < count]
+            update_beziercurve_path(self.path, controlpoints, indices)
+            # a segment is drawn between a control point and the next one.
+            dirty = set()
+            for index in indices:
+                dirty.update((index - 1, index))
+            for index in dirty.intersection(range(count - 1)):
+                self.segments[index] = get_bezier_segment(
+                    controlpoints[index], controlpoints[index + 1])
+        # the body is a copy of the path closed by the rect bottom, the copy
+        # is done by Qt without walking the control points.
+        self.body = create_beziercurve_body(self.path, CURVE_RECT)
+        self.revision = revision
+        self.indices = set()
+        self.rebuild = False
 
 
 class BezierEqualizer(QtWidgets.QWidget):
@@ -37,100 +104,252 @@ class BezierEqualizer(QtWidgets.QWidget):
 
         self.picked_center = None
         self.picked_tangent = None
-        self.controlpoints = []
+        self.lod_density = LOD_DENSITY
+        self.hovered = []
+        self.curve = BezierCurve()
+        # The control points are stored in CURVE_RECT, they are scaled to the
+        # widget pixels to be drawn and picked.
+        self.view_scale = 1.0, 1.0
+        self.controlpoints_index = ControlPointIndex()
+        # The background and the grid are rendered once in this pixmap. It
+        # has to be invalidated when their size, colors or divisions change.
+        self.background_cache = None
+        # The curve revision is incremented by every edit, the painter paths
+        # and the sampled segments are cached for the current revision.
+        self.revision = 0
+        self.path_cache = BezierPathCache()
+
+    @property
+    def controlpoints(self):
+        return self.curve.controlpoints
+
+    @controlpoints.setter
+    def controlpoints(self, controlpoints):
+        self.setCurve(BezierCurve(controlpoints))
+
+    def setCurve(self, curve):
+        # The picking index is rebuilt every time the curve is replaced and
+        # updated by the edits.
+        self.curve = curve
+        self.controlpoints_index = ControlPointIndex(
+            curve.controlpoints, self.view_scale)
+        self.invalidateCurve()
+        self.update()
+
+    def invalidateCurve(self, indices=None):
+        """
+        Increment the curve revision. The indices are the ones of the control
+        points edited since the last revision, the whole curve is rebuilt if
+        they are not given.
+        """
+        self.revision += 1
+        self.path_cache.invalidate(indices)
+
+    def _refresh_path_cache(self):
+        self.path_cache.refresh(self.controlpoints, self.revision)
+        return self.path_cache
+
+    def _update_index(self, first, last=None):
+        """
+        Update the picking index of the control points between the first and
+        the last index and their neighbours, which can be moved by the auto
+        tangent.
+        """
+        last = first if last is None else last
+        start = max(0, first - 1)
+        end = min(len(self.controlpoints), last + 2)
+        self.controlpoints_index.update(self.controlpoints[start:end])
 
     def _fix_boundaries(self):
         if not self.controlpoints:
             return
         #  this ensure the bezier curve is well stick to widget borders
-        self.controlpoints[0].center.setX(self.rect().left())
-        self.controlpoints[-1].center.setX(self.rect().right())
+        first, last = self.controlpoints[0], self.controlpoints[-1]
+        first.center = QtCore.QPointF(CURVE_RECT.left(), first.center.y())
+        last.center = QtCore.QPointF(CURVE_RECT.right(), last.center.y())
+        self.controlpoints_index.update((first, last))
+        self.invalidateCurve((0, len(self.controlpoints) - 1))
+
+    def isLodActive(self):
+        if self.lod_density is None:
+            return False
+        return len(self.controlpoints) > self.width() * self.lod_density
+
+    def _update_hovered(self, point=None):
+        """
+        Update the control points near the cursor which have their tangents
+        drawn in level of detail mode and repaint the ones which changed.
+        """
+        hovered = []
+        if point is not None and self.isLodActive():
+            hovered = self.controlpoints_index.around(point, LOD_HOVER_RADIUS)
+        changed = set(hovered).symmetric_difference(self.hovered)
+        self.hovered = hovered
+        if changed:
+            self.update(self._view_rect(changed).toAlignedRect())
 
     def mouseMoveEvent(self, event):
         if self.isclicked is False:
+            self._update_hovered(event.pos())
             return
 
+        # Only the region covering the edited control points, before and
+        # after the edit, is scheduled for repaint.
         if self.editabletangents is True and self.picked_tangent is not None:
+            index = find_controlpoint_index(
+                self.controlpoints, self.picked_tangent)
+            dirty = self._edition_rect(index)
             self.picked_tangent.autotangent = False
-            self.picked_tangent.move_tangent(event.pos())
-            auto_tangent_beziercurve(
+            self.picked_tangent.move_tangent(self._to_curve(event.pos()))
+            auto_tangent_neighbourhood(
                 controlpoints=self.controlpoints,
+                first=index,
                 skip=self.picked_tangent,
                 auto_tangent_function=self.auto_tangent_function)
-            self.repaint()
+            self._update_index(index)
+            self.invalidateCurve(range(index - 1, index + 2))
+            self.update(dirty.united(self._edition_rect(index)))
             self.bezierCurveEdited.emit()
             return
 
         if not self.picked_center:
-            self.repaint()
             self.bezierCurveEdited.emit()
             return
         rect = self.rect()
-        point = event.pos()
+        point = self._to_curve(event.pos())
         cursor = self.mapFromGlobal(QtGui.QCursor.pos())
-        self.picked_center.move(point, rect)
+        dirty = QtCore.QRect()
+        if self.holding is False:
+            index = find_controlpoint_index(
+                self.controlpoints, self.picked_center)
+            dirty = self._edition_rect(index)
+        self.picked_center.move(point, CURVE_RECT)
+        if self.holding is False:
+            self.invalidateCurve((index, ))
         offset = (rect.width() + rect.height()) / 10
         extended_rect = grow_rect(rect, offset)
         if self.picked_center.isboundary is True:
             self._fix_boundaries()
-            self.repaint()
+            self.update(dirty.united(self._edition_rect(index)))
             self.bezierCurveEdited.emit()
             return
+        # The control points list is kept sorted and only the tangents of
+        # the edited control point and its neighbours are recomputed.
         if not extended_rect.contains(cursor) and self.holding is False:
-            self.controlpoints.remove(self.picked_center)
+            self.controlpoints.pop(index)
+            self.controlpoints_index.remove(self.picked_center)
+            self.invalidateCurve()
             self.holding = True
+            first, last = index - 1, index
         elif extended_rect.contains(cursor) and self.holding is True:
-            self.controlpoints.append(self.picked_center)
-            self.controlpoints = sorted(self.controlpoints)
+            first = last = insert_controlpoint_sorted(
+                self.controlpoints, self.picked_center)
             self.holding = False
-        auto_tangent_beziercurve(
-            controlpoints=self.controlpoints,
-            auto_tangent_function=self.auto_tangent_function)
-        self.repaint()
+            self.invalidateCurve()
+        elif self.holding is False:
+            new_index = reorder_controlpoint(self.controlpoints, index)
+            first, last = min(index, new_index), max(index, new_index)
+        else:
+            first = last = None
+        if first is not None:
+            auto_tangent_neighbourhood(
+                controlpoints=self.controlpoints,
+                first=first,
+                last=last,
+                auto_tangent_function=self.auto_tangent_function)
+            self._update_index(first, last)
+            self.invalidateCurve(range(first - 1, last + 2))
+            dirty = dirty.united(self._edition_rect(first, last))
+        if not dirty.isNull():
+            self.update(dirty)
         self.bezierCurveEdited.emit()
 
+    def _edition_rect(self, first, last=None):
+        """
+        Return the widget region drawn by the control points between the
+        first and the last index. It covers their neighbours, which have
+        their auto tangent recomputed, and the segments reaching them.
+        """
+        last = first if last is None else last
+        start = max(0, first - 2)
+        end = min(len(self.controlpoints), last + 3)
+        rect = self._view_rect(self.controlpoints[start:end])
+        if self.drawbody is True:
+            rect.setBottom(self.rect().bottom())
+        return rect.toAlignedRect()
+
+    def _view_rect(self, controlpoints):
+        """
+        Return the widget region covered by the given control points, their
+        handles and the curve border.
+        """
+        rect = get_controlpoints_bounding_rect(controlpoints)
+        scale_x, scale_y = self.view_scale
+        rect = QtCore.QRectF(
+            rect.x() * scale_x, rect.y() * scale_y,
+            rect.width() * scale_x, rect.height() * scale_y)
+        return rect.adjusted(
+            -DIRTY_MARGIN, -DIRTY_MARGIN, DIRTY_MARGIN, DIRTY_MARGIN)
+
+    def _to_curve(self, point):
+        scale_x, scale_y = self.view_scale
+        return QtCore.QPointF(point.x() / scale_x, point.y() / scale_y)
+
     def mousePressEvent(self, event):
         if not self.controlpoints:
             return
 
         self.isclicked = True
         point = event.pos()
-        controlpoints = self.controlpoints
-        self.picked_center = pick_controlpoint_center(controlpoints, point)
-        self.picked_tangent = pick_controlpoint_tangent(controlpoints, point)
+        self.picked_center = self.controlpoints_index.pick_center(point)
+        self.picked_tangent = self.controlpoints_index.pick_tangent(point)
 
         if not self.picked_center and not self.picked_tangent:
-            controlpoint = insert_controlpoint_in_curve(point, controlpoints)
-            self.controlpoints.append(controlpoint)
-            self.controlpoints = sorted(controlpoints)
-            auto_tangent_beziercurve(
-                self.controlpoints, self.auto_tangent_function)
+            controlpoint = ControlPoint(self._to_curve(point))
+            index = insert_controlpoint_sorted(
+                self.controlpoints, controlpoint)
+            auto_tangent_neighbourhood(
+                controlpoints=self.controlpoints,
+                first=index,
+                auto_tangent_function=self.auto_tangent_function)
+            self._update_index(index)
+            self.invalidateCurve()
             self.picked_center = controlpoint
 
         if self.picked_center:
             select_controlpoint(self.picked_center, self.controlpoints)
 
-        self.repaint()
+        self.update()
         self.bezierCurveEditBegin.emit()
 
-    def mouseReleaseEvent(self, _):
+    def mouseReleaseEvent(self, event):
         self.isclicked = False
         self.picked_center = None
         self.picked_tangent = None
         self.holding = False
-        self.repaint()
+        self._update_hovered(event.pos())
+        self.update()
         self.bezierCurveEditEnd.emit()
 
-    def resizeEvent(self, event):
-        if self.isVisible() is False or not self.controlpoints:
-            return
-        for controlpoint in self.controlpoints:
-            controlpoint.resize(event.oldSize(), event.size())
-        self._fix_boundaries()
-        self.repaint()
+    def leaveEvent(self, _):
+        self._update_hovered()
 
-    def paintEvent(self, _):
-        painter = QtGui.QPainter(self)
+    def resizeEvent(self, _):
+        # The curve is stored in CURVE_RECT, only its view scale changes. The
+        # scale is a float to keep the divisions by it true with python 2.
+        self.background_cache = None
+        rect = self.rect()
+        self.view_scale = (
+            float(max(1, rect.right())), float(max(1, rect.bottom())))
+        self.controlpoints_index.scale = self.view_scale
+        self.update()
+
+    def _render_background(self):
+        ratio = self.devicePixelRatioF()
+        pixmap = QtGui.QPixmap(self.size() * ratio)
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(QtCore.Qt.transparent)
+        painter = QtGui.QPainter(pixmap)
         painter.setRenderHint(self.renderhint)
         rect = self.rect()
         draw_background(painter, rect, self.colors)
@@ -142,26 +361,73 @@ class BezierEqualizer(QtWidgets.QWidget):
                 vertical_big_graduation=self.grid_main_disivions_mult,
                 horizontal_big_graduation=self.grid_main_disivions_mult,
                 colors=None)
+        painter.end()
+        return pixmap
+
+    def paintEvent(self, event):
+        cache = self.background_cache
+        # the widget can be moved on a screen with another pixel ratio
+        ratio = self.devicePixelRatioF()
+        if cache is None or cache.devicePixelRatio() != ratio:
+            self.background_cache = self._render_background()
+        # only the exposed region is drawn.
+        exposed = event.rect()
+        painter = QtGui.QPainter(self)
+        painter.setClipRect(exposed)
+        source = QtCore.QRectF(
+            exposed.x() * ratio, exposed.y() * ratio,
+            exposed.width() * ratio, exposed.height() * ratio)
+        target = QtCore.QRectF(exposed)
+        painter.drawPixmap(target, self.background_cache, source)
+        painter.setRenderHint(self.renderhint)
         if not self.controlpoints:
             return
+        cache = self._refresh_path_cache()
+        # The paths are drawn with the view scale as painter transform, the
+        # curve pen is cosmetic and keeps its width in pixels.
+        painter.setTransform(QtGui.QTransform.fromScale(*self.view_scale))
         if self.drawbody is True:
-            path = create_beziercurve_path(self.controlpoints, self.rect())
-            draw_bezierbody(painter, path, self.colors)
-        path = create_beziercurve_path(self.controlpoints)
-        draw_bezierpath(painter, path, self.colors)
-        for controlpoint in self.controlpoints:
-            draw_controlpoint(
-                painter=painter,
-                controlpoint=controlpoint,
-                drawtangent=self.editabletangents,
-                colors=self.colors)
+            draw_bezierbody(painter, cache.body, self.colors)
+        draw_bezierpath(painter, cache.path, self.colors)
+        painter.resetTransform()
+        scale_x, scale_y = self.view_scale
+        exposed = QtCore.QRectF(
+            exposed.x() / scale_x, exposed.y() / scale_y,
+            exposed.width() / scale_x, exposed.height() / scale_y)
+        margin_x, margin_y = DIRTY_MARGIN / scale_x, DIRTY_MARGIN / scale_y
+        controlpoints = [
+            controlpoint for controlpoint in self.controlpoints
+            if exposed.intersects(
+                get_controlpoints_bounding_rect([controlpoint]).adjusted(
+                    -margin_x, -margin_y, margin_x, margin_y))]
+        handles = None
+        if self.isLodActive():
+            handles = set(self.hovered)
+            handles.update(cp for cp in controlpoints if cp.selected)
+            if self.picked_tangent is not None:
+                handles.add(self.picked_tangent)
+        draw_controlpoints(
+            painter=painter,
+            controlpoints=controlpoints,
+            drawtangent=self.editabletangents,
+            colors=self.colors,
+            handles=handles,
+            scale=self.view_scale)
 
     def clear(self):
         self.controlpoints = []
 
     def values(self, sample):
-        rect = self.rect()
-        return compute_bezier_curve_values(self.controlpoints[:], rect, sample)
+        if not self.controlpoints:
+            return self.curve.values(sample)
+        segments = self._refresh_path_cache().segments
+        return self.curve.values(sample, segments)
+
+    def valuesPerSample(self, samples, threads=None):
+        if not self.controlpoints:
+            return self.curve.values_per_sample(samples, threads=threads)
+        segments = self._refresh_path_cache().segments
+        return self.curve.values_per_sample(samples, segments, threads)
 
     def selectedControlPoint(self):
         for controlpoint in self.controlpoints:
@@ -169,54 +435,72 @@ class BezierEqualizer(QtWidgets.QWidget):
                 return controlpoint
         return None
 
-    def setValues(self, values):
+    def setValues(self, values, tolerance=None):
+        """
+        Create a linear curve drawing the values. If a tolerance is given,
+        the values are approximated by a smooth curve within it when this
+        needs less control points, see fitting.fit_values.
+        """
         if not values:
-            self.controlpoints = []
+            self.setCurve(BezierCurve())
             return
-        if len(values) == 1:
-            raise ValueError('At least 2 values has to be provided')
-        rect = self.rect()
-        self.controlpoints = create_beziercurve(values, rect, linear=True)
-        self.controlpoints[0].isboundary = True
-        self.controlpoints[-1].isboundary = True
-        self.repaint()
+        self.setCurve(
+            BezierCurve.from_values(values, linear=True, tolerance=tolerance))
 
     def setColor(self, key, colorname):
         if key not in self.colors:
             raise KeyError('{} is not a valid key'.format(key))
         self.colors[key] = colorname
+        self.background_cache = None
 
     def updateColors(self, colors):
         for key in colors:
             if key not in self.colors:
                 raise KeyError('{} is not a valid key'.format(key))
         self.colors.update(colors)
+        self.background_cache = None
 
     def autoTangent(self):
-        auto_tangent_beziercurve(
-            self.controlpoints, self.auto_tangent_function)
-        self.repaint()
+        self.curve.auto_tangent(self.auto_tangent_function)
+        self.controlpoints_index = ControlPointIndex(
+            self.controlpoints, self.view_scale)
+        self.invalidateCurve()
+        self.update()
 
     def setRenderHint(self, renderhint):
         self.renderhint = renderhint
+        self.background_cache = None
 
     def setGridVisible(self, state):
         self.gridvisible = state
+        self.background_cache = None
 
     def setEditableTangents(self, state):
         self.editabletangents = state
 
+    def setLodDensity(self, density):
+        """
+        Set the count of control points per horizontal pixel above which the
+        level of detail mode is active, None disables it.
+        """
+        self.lod_density = density
+        self._update_hovered()
+        self.update()
+
     def setBodyVisible(self, state):
         self.drawbody = state
 
     def setGridHorizontalDivision(self, division):
         self.grid_horizontal_divisions = division
+        self.background_cache = None
 
     def setGridVerticalDivision(self, division):
         self.grid_vertical_divisions = division
+        self.background_cache = None
 
     def setGridMainDivisionsMult(self, division):
         self.grid_main_disivions_mult = division
+        self.background_cache = None
 
     def setAutoTangentMode(self, mode):
         auto_tangent_functions = [
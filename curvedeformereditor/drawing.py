@@ -1,5 +1,6 @@
 from PySide2 import QtCore, QtGui
 from curvedeformereditor.arrayutils import split_value
+from curvedeformereditor.beziercurve import get_bezier_segment
 
 
 COLORS = {
@@ -17,43 +18,99 @@ COLORS = {
 }
 
 
-def create_rect_from_point(center, segment_lenght=8):
-    rectangle = QtCore.QRectF(0, 0, segment_lenght, segment_lenght)
-    rectangle.moveCenter(center)
-    return rectangle
+def create_rect_from_coordinates(x, y, segment_lenght=8):
+    half = segment_lenght / 2.0
+    return QtCore.QRectF(x - half, y - half, segment_lenght, segment_lenght)
 
 
-def clamp_point_in_rect(point, rect):
-    if point.x() < rect.left():
-        point.setX(rect.left())
-    if point.x() > rect.right():
-        point.setX(rect.right())
-    if point.y() < rect.top():
-        point.setY(rect.top())
-    if point.y() > rect.bottom():
-        point.setY(rect.bottom())
+def get_path_segment_points(controlpoints, index):
+    """
+    This function return the three (x, y) points of the cubicTo drawn from
+    the previous control point to the one at the given index of a sorted
+    control points list. A linear control point draw a straight line from
+    the previous one.
+    """
+    segment = get_bezier_segment(
+        controlpoints[index - 1], controlpoints[index])
+    return segment[1:]
 
 
-def create_beziercurve_path(controlpoints, rect=None):
+def create_beziercurve_path(controlpoints):
     controlpoints = sorted(controlpoints)
-    center = controlpoints[0].center
-    out = controlpoints[0].tangentout
-    path = QtGui.QPainterPath(center)
-    for controlpoint in controlpoints:
-        if controlpoint.linear is True:
-            path.cubicTo(*[controlpoint.center] * 3)
-            out = controlpoint.center
+    center_x, center_y = controlpoints[0].coordinates()[:2]
+    path = QtGui.QPainterPath(QtCore.QPointF(center_x, center_y))
+    for index in range(1, len(controlpoints)):
+        (out_x, out_y), (in_x, in_y), (center_x, center_y) = (
+            get_path_segment_points(controlpoints, index))
+        path.cubicTo(out_x, out_y, in_x, in_y, center_x, center_y)
+    return path
+
+
+def create_beziercurve_body(path, rect):
+    """
+    This function return a copy of the bezier curve path closed by the
+    bottom of the rect.
+    """
+    body = QtGui.QPainterPath(path)
+    body.lineTo(rect.right(), rect.bottom())
+    body.lineTo(rect.left(), rect.bottom())
+    body.closeSubpath()
+    return body
+
+
+def get_beziercurve_path_elements_count(controlpoints):
+    """
+    This function return the elements count of a path created by
+    create_beziercurve_path if no element was skipped. QPainterPath skips
+    the degenerated curves, the elements of such a path can't be updated by
+    index.
+    """
+    return 1 + max(0, len(controlpoints) - 1) * 3
+
+
+def update_beziercurve_path(path, controlpoints, indices):
+    """
+    This function update in place the elements of a path created by
+    create_beziercurve_path for the control points at the given indices.
+    The control points list has to be sorted and keep the same length as
+    the one the path was created with. The element 0 is the first control
+    point center then every next control point owns three elements.
+    """
+    count = len(controlpoints)
+    # the cubicTo of a control point also depends on its previous one.
+    dirty = set()
+    for index in indices:
+        dirty.update(i for i in (index, index + 1) if 0 <= i < count)
+    for index in sorted(dirty):
+        if index == 0:
+            x, y = controlpoints[0].coordinates()[:2]
+            path.setElementPositionAt(0, x, y)
             continue
-        path.cubicTo(out, controlpoint.tangentin, controlpoint.center)
-        out = controlpoint.tangentout
-    if rect is None:
-        return path
-    path.lineTo(rect.bottomRight())
-    path.lineTo(rect.bottomLeft())
-    path.lineTo(controlpoints[0].center)
+        points = get_path_segment_points(controlpoints, index)
+        for offset, (x, y) in enumerate(points):
+            path.setElementPositionAt(1 + (index - 1) * 3 + offset, x, y)
     return path
 
 
+def get_controlpoints_bounding_rect(controlpoints, margin=0):
+    """
+    This function return the rect containing the centers and the tangents of
+    the given control points. As a bezier segment is contained in the convex
+    hull of its control points, it contains the segments between them too.
+    """
+    xs = []
+    ys = []
+    for controlpoint in controlpoints:
+        coordinates = controlpoint.coordinates()
+        xs.extend(coordinates[::2])
+        ys.extend(coordinates[1::2])
+    if not xs:
+        return QtCore.QRectF()
+    return QtCore.QRectF(
+        min(xs) - margin, min(ys) - margin,
+        max(xs) - min(xs) + margin * 2, max(ys) - min(ys) + margin * 2)
+
+
 def grow_rect(rect, value):
     return QtCore.QRect(
         rect.left() - value,
@@ -110,38 +167,53 @@ def draw_grid(
             QtCore.QPoint(rect.right(), top))
 
 
-def draw_controlpoint(painter, controlpoint, drawtangent=True, colors=None):
+def draw_controlpoints(
+        painter, controlpoints, drawtangent=True, colors=None, handles=None,
+        scale=(1.0, 1.0)):
+    """
+    This function draw the control points centers and tangents. The
+    primitives sharing a color are drawn by a single drawRects or drawLines
+    call. If handles is given, only the tangents of the control points it
+    contains are drawn. The control points coordinates are multiplied by
+    the x and y scale.
+    """
     colors = colors or COLORS.copy()
-    selected = 'controlpoint.centerselected'
-    colorkey = selected if controlpoint.selected else 'controlpoint.center'
-    painter.setBrush(QtGui.QColor(colors[colorkey]))
-    painter.setPen(QtGui.QColor(colors[colorkey]))
-    center_rect = create_rect_from_point(controlpoint.center)
-    painter.drawRect(center_rect)
-
-    if drawtangent is False or controlpoint.linear is True:
-        return
-
+    scale_x, scale_y = scale
+    centers = [
+        ('controlpoint.center', []),
+        ('controlpoint.centerselected', [])]
+    tangents = [
+        ('controlpoint.tangentlocked', [], []),
+        ('controlpoint.autotangent', [], [])]
+    for controlpoint in controlpoints:
+        center_x, center_y, in_x, in_y, out_x, out_y = [
+            coordinate * factor for coordinate, factor in
+            zip(controlpoint.coordinates(), (scale_x, scale_y) * 3)]
+        rects = centers[int(controlpoint.selected)][1]
+        rects.append(create_rect_from_coordinates(center_x, center_y))
+        if drawtangent is False or controlpoint.linear is True:
+            continue
+        if handles is not None and controlpoint not in handles:
+            continue
+        _, rects, lines = tangents[int(controlpoint.autotangent)]
+        rects.append(create_rect_from_coordinates(in_x, in_y))
+        rects.append(create_rect_from_coordinates(out_x, out_y))
+        lines.append(QtCore.QLineF(in_x, in_y, center_x, center_y))
+        lines.append(QtCore.QLineF(center_x, center_y, out_x, out_y))
+
+    for colorkey, rects in centers:
+        if not rects:
+            continue
+        painter.setBrush(QtGui.QColor(colors[colorkey]))
+        painter.setPen(QtGui.QColor(colors[colorkey]))
+        painter.drawRects(rects)
     painter.setBrush(QtGui.QColor(0, 0, 0, 0))
-    if controlpoint.autotangent is True:
-        color = colors['controlpoint.autotangent']
-    else:
-        color = colors['controlpoint.tangentlocked']
-    painter.setPen(QtGui.QColor(color))
-
-    tin_rect = create_rect_from_point(controlpoint.tangentin)
-    painter.drawRect(tin_rect)
-    line = QtCore.QLine(
-        controlpoint.tangentin.toPoint(),
-        controlpoint.center.toPoint())
-    painter.drawLine(line)
-
-    tout_rect = create_rect_from_point(controlpoint.tangentout)
-    painter.drawRect(tout_rect)
-    line = QtCore.QLine(
-        controlpoint.center.toPoint(),
-        controlpoint.tangentout.toPoint())
-    painter.drawLine(line)
+    for colorkey, rects, lines in tangents:
+        if not rects:
+            continue
+        painter.setPen(QtGui.QColor(colors[colorkey]))
+        painter.drawRects(rects)
+        painter.drawLines(lines)
 
 
 def draw_bezierpath(painter, path, colors=None):
@@ -149,6 +221,8 @@ def draw_bezierpath(painter, path, colors=None):
     brush = QtGui.QBrush(QtGui.QColor(0, 0, 0, 0))
     pen = QtGui.QPen(QtGui.QColor(colors['bezier.border']))
     pen.setWidth(colors['bezier.borderwidth'])
+    # the width stays in pixels if the painter is transformed.
+    pen.setCosmetic(True)
     painter.setBrush(brush)
     painter.setPen(pen)
     painter.drawPath(path)
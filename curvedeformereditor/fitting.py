@@ -0,0 +1,239 @@
+"""
+Approximation of a list of values by a smooth bezier curve. The curve goes
+through a subset of the values, the knots, and the slopes of the tangents
+at the knots are fitted by least squares on all the values. The values are
+placed along x from 0 to 1 and the tangents are a third of their segment
+width long in x. This makes x linear along every segment, which is then
+the cubic hermite polynomial of the values between its two knots.
+"""
+import timeit
+try:
+    import numpy
+except ImportError:
+    numpy = None
+from curvedeformereditor.arrayutils import split_value, split_value_array
+
+
+# Weight of the slope estimated from the neighbour knots in the fitting of
+# every knot slope. It keeps the system solvable when there is no value
+# between two knots.
+SLOPE_REGULARIZATION = 1e-3
+# Maximum time in seconds spent to fit a curve. The weights are fitted on
+# every selection change, a longer fitting is given up.
+FITTING_TIME_LIMIT = 0.2
+
+
+def fit_values(values, tolerance, time_limit=FITTING_TIME_LIMIT):
+    """
+    This function approximate the values by a smooth curve within the
+    tolerance. It return the indices of the values used as knots and the
+    slopes of the curve at these knots.
+    Every pass adds a knot in every run of values out of the tolerance, at
+    its value the farthest from the current fitted curve, until the
+    tolerance is reached. It returns None if the time limit is exceeded
+    before, a time limit of None never gives up.
+    """
+    start = timeit.default_timer()
+    knots = [0, len(values) - 1]
+    while True:
+        slopes = fit_slopes(values, knots)
+        fitted = evaluate_fit(values, knots, slopes)
+        if numpy is not None:
+            errors = numpy.abs(numpy.asarray(values, dtype=float) - fitted)
+        else:
+            errors = [abs(v - f) for v, f in zip(values, fitted)]
+        indices = get_worst_indices(errors, tolerance)
+        if not indices:
+            return knots, slopes
+        if (time_limit is not None and
+                timeit.default_timer() - start > time_limit):
+            return None
+        knots = sorted(knots + indices)
+
+
+def get_worst_indices(errors, tolerance):
+    """
+    This function return the index of the largest error of every run of
+    consecutive values out of the tolerance. The knots have no error, a run
+    never goes through a knot.
+    """
+    if numpy is not None:
+        exceed = numpy.concatenate(([False], errors > tolerance, [False]))
+        bounds = numpy.flatnonzero(exceed[1:] != exceed[:-1])
+        return [
+            start + int(errors[start:end].argmax())
+            for start, end in zip(bounds[::2], bounds[1::2])]
+    indices = []
+    worst = None
+    for i, error in enumerate(errors):
+        if error <= tolerance:
+            if worst is not None:
+                indices.append(worst)
+            worst = None
+        elif worst is None or error > errors[worst]:
+            worst = i
+    if worst is not None:
+        indices.append(worst)
+    return indices
+
+
+def get_hermite_components(start, end, width, parameter):
+    """
+    This function return the value of a segment of the curve at the given
+    parameter as: base + p * slope_start + q * slope_end.
+    It returns the base, p and q. This works with numpy arrays as well.
+    """
+    complement = 1 - parameter
+    b0 = complement ** 3
+    b1 = 3 * complement ** 2 * parameter
+    b2 = 3 * complement * parameter ** 2
+    b3 = parameter ** 3
+    base = (b0 + b1) * start + (b2 + b3) * end
+    return base, b1 * width / 3.0, -b2 * width / 3.0
+
+
+def estimate_slopes(values, knots, positions):
+    """
+    This function return the slope of the line between the neighbours of
+    every knot.
+    """
+    slopes = []
+    for j in range(len(knots)):
+        before = knots[max(0, j - 1)]
+        after = knots[min(len(knots) - 1, j + 1)]
+        slopes.append(
+            (values[after] - values[before]) /
+            (positions[after] - positions[before]))
+    return slopes
+
+
+def fit_slopes(values, knots):
+    """
+    This function compute the slopes at the knots which minimize the squared
+    distance between the values and the curve. As a slope only drives the
+    two segments around its knot, the normal equations are tridiagonal.
+    """
+    if numpy is not None:
+        positions = split_value_array(1.0, len(values))
+        diagonal, upper, rhs = accumulate_normal_equations_array(
+            values, knots, positions)
+    else:
+        positions = split_value(1.0, len(values))
+        diagonal, upper, rhs = accumulate_normal_equations(
+            values, knots, positions)
+    estimations = estimate_slopes(values, knots, positions)
+    for j, estimation in enumerate(estimations):
+        before = positions[knots[j]] - positions[knots[max(0, j - 1)]]
+        after = positions[knots[min(len(knots) - 1, j + 1)]] - positions[
+            knots[j]]
+        weight = SLOPE_REGULARIZATION * (before ** 2 + after ** 2) / 9.0
+        diagonal[j] += weight
+        rhs[j] += weight * estimation
+    return solve_tridiagonal(diagonal, upper, rhs)
+
+
+def accumulate_normal_equations(values, knots, positions):
+    count = len(knots)
+    diagonal = [0.0] * count
+    upper = [0.0] * (count - 1)
+    rhs = [0.0] * count
+    for j in range(count - 1):
+        start, end = knots[j], knots[j + 1]
+        width = positions[end] - positions[start]
+        for i in range(start + 1, end):
+            parameter = (positions[i] - positions[start]) / width
+            base, p, q = get_hermite_components(
+                values[start], values[end], width, parameter)
+            residual = values[i] - base
+            diagonal[j] += p * p
+            diagonal[j + 1] += q * q
+            upper[j] += p * q
+            rhs[j] += p * residual
+            rhs[j + 1] += q * residual
+    return diagonal, upper, rhs
+
+
+def accumulate_normal_equations_array(values, knots, positions):
+    """
+    Vectorized version of accumulate_normal_equations, every value is
+    processed at once. The knots have no weight in the sums: their p and q
+    are 0.
+    """
+    count = len(knots)
+    values = numpy.asarray(values, dtype=float)
+    positions = numpy.asarray(positions, dtype=float)
+    knots = numpy.asarray(knots)
+    segments, parameters, widths = get_segments_array(knots, positions)
+    base, p, q = get_hermite_components(
+        values[knots[segments]], values[knots[segments + 1]],
+        widths, parameters)
+    residuals = values - base
+    diagonal = (
+        numpy.bincount(segments, p * p, minlength=count) +
+        numpy.bincount(segments + 1, q * q, minlength=count))
+    upper = numpy.bincount(segments, p * q, minlength=count - 1)
+    rhs = (
+        numpy.bincount(segments, p * residuals, minlength=count) +
+        numpy.bincount(segments + 1, q * residuals, minlength=count))
+    return diagonal.tolist(), upper[:count - 1].tolist(), rhs.tolist()
+
+
+def get_segments_array(knots, positions):
+    """
+    This function return for every value the index of the segment containing
+    it, its parameter on the segment and the segment width.
+    """
+    indices = numpy.arange(len(positions))
+    segments = numpy.searchsorted(knots, indices, side='right') - 1
+    segments = numpy.clip(segments, 0, len(knots) - 2)
+    starts = positions[knots[segments]]
+    widths = positions[knots[segments + 1]] - starts
+    return segments, (positions - starts) / widths, widths
+
+
+def solve_tridiagonal(diagonal, upper, rhs):
+    """
+    This function solve a symmetric tridiagonal system with the Thomas
+    algorithm.
+    """
+    count = len(diagonal)
+    diagonal = list(diagonal)
+    rhs = list(rhs)
+    for i in range(1, count):
+        factor = upper[i - 1] / diagonal[i - 1]
+        diagonal[i] -= factor * upper[i - 1]
+        rhs[i] -= factor * rhs[i - 1]
+    solution = [0.0] * count
+    solution[-1] = rhs[-1] / diagonal[-1]
+    for i in range(count - 2, -1, -1):
+        solution[i] = (rhs[i] - upper[i] * solution[i + 1]) / diagonal[i]
+    return solution
+
+
+def evaluate_fit(values, knots, slopes):
+    """
+    This function return the fitted curve value at the position of every
+    value.
+    """
+    if numpy is not None:
+        positions = split_value_array(1.0, len(values))
+        values = numpy.asarray(values, dtype=float)
+        slopes = numpy.asarray(slopes, dtype=float)
+        knots = numpy.asarray(knots)
+        segments, parameters, widths = get_segments_array(knots, positions)
+        base, p, q = get_hermite_components(
+            values[knots[segments]], values[knots[segments + 1]],
+            widths, parameters)
+        return base + p * slopes[segments] + q * slopes[segments + 1]
+    positions = split_value(1.0, len(values))
+    fitted = []
+    for j in range(len(knots) - 1):
+        start, end = knots[j], knots[j + 1]
+        width = positions[end] - positions[start]
+        for i in range(start, end):
+            parameter = (positions[i] - positions[start]) / width
+            base, p, q = get_hermite_components(
+                values[start], values[end], width, parameter)
+            fitted.append(base + p * slopes[j] + q * slopes[j + 1])
+    fitted.append(values[-1])
+    return fitted
@@ -1,15 +1,30 @@
 import os
+from functools import partial
 import maya.OpenMaya as om
 from maya import cmds
 from PySide2 import QtWidgets, QtCore, QtGui
 from curvedeformereditor.bezierequalizer import BezierEqualizer
-from curvedeformereditor.beziercurve import copy_bezier_curve
+from curvedeformereditor.arrayutils import resample_values
+from curvedeformereditor.beziercurve import (
+    BezierSnapshot, close_sampling_pools)
+from curvedeformereditor.memory import ControlPointsMemory
+from curvedeformereditor.presets import preset_library
 from curvedeformereditor.nurbsutils import (
-    get_deformer_weights_per_cv, set_deformer_weights_per_cv, count_cv)
+    get_deformer_weights_per_cv, set_deformer_weights_per_cv,
+    get_deformer_profiles, set_deformer_profiles, resolution_cache)
 
 
 SUPPORTED_DEFORMERS = 'blendShape', 'cluster', 'skinCluster'
 WINDOW_TITLE = 'Curve Deformer Editor'
+# Interval in milliseconds between two weights push to maya during a drag.
+# None push on every mouse move, 0 push once per event loop idle tick.
+DEFAULT_LIVEUPDATE_INTERVAL = 0
+# Backend used to write the weights during a drag. The writes done with it
+# are not recorded in the undo queue, see CurveDeformerEditor._call_edit_end.
+INTERIM_WEIGHTS_WRITER = 'plug'
+# Maximum difference between the weights read from maya and the curve
+# fitted on them. None creates a control point per weights break.
+DEFAULT_FITTING_TOLERANCE = 5e-3
 
 
 def icon(filename):
@@ -24,6 +39,7 @@ class CurveDeformerEditor(QtWidgets.QWidget):
         super(CurveDeformerEditor, self).__init__(parent, QtCore.Qt.Tool)
         self.setWindowTitle(WINDOW_TITLE)
         self.callbacks = []
+        self.curves_callbacks = []
         self.curves = []
 
         # This dictionary backup the control points used to edit a deformer
@@ -32,8 +48,37 @@ class CurveDeformerEditor(QtWidgets.QWidget):
         # the maya nodes and the result is different when the curve is
         # generated for the maya data. This keep the controlpoints if a curve
         # is unselected and reselected after.
+        # The curves edited together share the same immutable snapshot.
+        # The control points are saved on the deformer node as well, they
+        # are read back when a curve is edited again after a scene reopen.
         self.reset_memory_callbacks = None
-        self.controlpoints_per_deformers = {}
+        self.controlpoints_per_deformers = ControlPointsMemory(
+            reader=get_deformer_profiles)
+        # The presets are decoded once and shared by the editors.
+        self.preset_library = preset_library
+
+        # During a drag, the weights push to maya are coalesced: the edits
+        # mark the weights as dirty and the timer push the last state. The
+        # final state is always pushed at the end of the edit.
+        self.liveupdate_interval = DEFAULT_LIVEUPDATE_INTERVAL
+        self.preview_sample = None
+        self.liveupdate_timer = QtCore.QTimer(self)
+        self.liveupdate_timer.setSingleShot(True)
+        self.liveupdate_timer.timeout.connect(self._call_liveupdate)
+        # Last weights written per (curve, deformer) during the current edit.
+        # Only the weights which changed since are written again. This is
+        # only used during an edit because the weights can be changed
+        # outside the editor (undo, paint tool ...).
+        # The weights before the edit are kept as well to record the whole
+        # edit as one undoable write at its end.
+        self.editing = False
+        self.written_weights = {}
+        self.initial_weights = {}
+        self.fitting_tolerance = DEFAULT_FITTING_TOLERANCE
+        # The weights of every cv count are sampled at once, shared between
+        # threads for the batches above PARALLEL_SAMPLING_MINIMUM. Only the
+        # maya writes are done one curve after the other.
+        self.sampling_threads = None
 
         img = icon('linear_selected.png')
         self.linear_selected = QtWidgets.QAction(img, '', self)
@@ -63,29 +108,36 @@ class CurveDeformerEditor(QtWidgets.QWidget):
         self.bezierequalizer.setEditableTangents(False)
         self.bezierequalizer.setBodyVisible(True)
         self.bezierequalizer.setAutoTangentMode(BezierEqualizer.Flatten)
-        self.bezierequalizer.bezierCurveEdited.connect(self.weightschanged)
-        self.bezierequalizer.bezierCurveEditBegin.connect(open_undochunk)
-        self.bezierequalizer.bezierCurveEditEnd.connect(close_undochunk)
+        self.bezierequalizer.bezierCurveEdited.connect(self._call_edited)
+        self.bezierequalizer.bezierCurveEditBegin.connect(
+            self._call_edit_begin)
+        self.bezierequalizer.bezierCurveEditEnd.connect(self._call_edit_end)
 
         self.deformers = QtWidgets.QComboBox()
         self.deformers.currentTextChanged.connect(self._call_update_values)
 
         self.smooth_in = QtWidgets.QAction(icon('smooth_in.png'), '', self)
-        self.smooth_in.triggered.connect(self._call_smooth_in)
+        self.smooth_in.triggered.connect(
+            partial(self._call_preset, 'smooth_in'))
         self.smooth_out = QtWidgets.QAction(icon('smooth_out.png'), '', self)
-        self.smooth_out.triggered.connect(self._call_smooth_out)
+        self.smooth_out.triggered.connect(
+            partial(self._call_preset, 'smooth_out'))
         self.linear_in = QtWidgets.QAction(icon('linear_in.png'), '', self)
-        self.linear_in.triggered.connect(self._call_linear_in)
+        self.linear_in.triggered.connect(
+            partial(self._call_preset, 'linear_in'))
         self.linear_out = QtWidgets.QAction(icon('linear_out.png'), '', self)
-        self.linear_out.triggered.connect(self._call_linear_out)
+        self.linear_out.triggered.connect(
+            partial(self._call_preset, 'linear_out'))
         self.full = QtWidgets.QAction(icon('full.png'), '', self)
-        self.full.triggered.connect(self._call_full)
+        self.full.triggered.connect(partial(self._call_preset, 'full'))
         self.off = QtWidgets.QAction(icon('off.png'), '', self)
-        self.off.triggered.connect(self._call_off)
+        self.off.triggered.connect(partial(self._call_preset, 'off'))
         self.spike = QtWidgets.QAction(icon('positive_spike.png'), '', self)
-        self.spike.triggered.connect(self._call_positive_spike)
+        self.spike.triggered.connect(
+            partial(self._call_preset, 'positive_spike'))
         self.spike2 = QtWidgets.QAction(icon('negative_spike.png'), '', self)
-        self.spike2.triggered.connect(self._call_negative_spike)
+        self.spike2.triggered.connect(
+            partial(self._call_preset, 'negative_spike'))
         self.presets = QtWidgets.QToolBar()
         self.presets.setIconSize(QtCore.QSize(16, 16))
         self.presets.addWidget(QtWidgets.QLabel('predifined'))
@@ -116,30 +168,112 @@ class CurveDeformerEditor(QtWidgets.QWidget):
         self.register_callback()
         self.maya_selection_changed()
 
+    def setLiveUpdateInterval(self, interval):
+        """
+        Set the minimum interval in milliseconds between two weights push to
+        maya during a drag. None push the weights on every mouse move and 0
+        push once per event loop idle tick.
+        """
+        self.liveupdate_interval = interval
+
+    def setPreviewSample(self, sample):
+        """
+        Set the number of samples evaluated for the weights pushed during a
+        drag. The values are linearly resampled on the cvs of every curves.
+        None evaluate the full resolution. The final push at the end of the
+        edit is always evaluated in full resolution.
+        """
+        self.preview_sample = sample
+
+    def setFittingTolerance(self, tolerance):
+        """
+        Set the maximum difference between the weights read from maya and
+        the smooth curve fitted on them. None disables the fitting.
+        """
+        self.fitting_tolerance = tolerance
+
+    def setSamplingThreads(self, threads):
+        """
+        Set the number of threads sampling the weights of all the cv counts.
+        1 forces the serial sampling and None uses the default of
+        beziercurve.get_default_sampling_threads.
+        """
+        self.sampling_threads = threads
+
+    def _call_edited(self):
+        if self.liveupdate_interval is None:
+            self.weightschanged(preview=True)
+            return
+        if not self.liveupdate_timer.isActive():
+            self.liveupdate_timer.start(self.liveupdate_interval)
+
+    def _call_liveupdate(self):
+        self.weightschanged(preview=True)
+
+    def _call_edit_begin(self):
+        self.editing = True
+        self.written_weights = {}
+        self.initial_weights = {}
+        deformer = self.deformers.currentText()
+        if not deformer:
+            return
+        for curve in self.curves:
+            weights = get_deformer_weights_per_cv(curve, deformer)
+            self.initial_weights[(curve, deformer)] = weights
+
+    def _call_edit_end(self):
+        """
+        The weights written during the drag are not undoable. At the end,
+        the weights before the drag are restored, out of the undo queue as
+        well, and the final weights are written once in an undo chunk. This
+        way a drag produce one undo entry per curve. Only the ranges which
+        changed since the drag began are written and recorded.
+        """
+        self.liveupdate_timer.stop()
+        restored_weights = {}
+        for (curve, deformer), weights in self.initial_weights.items():
+            written = self.written_weights.get((curve, deformer))
+            if written is None:
+                restored_weights[(curve, deformer)] = weights
+                continue
+            restored_weights[(curve, deformer)] = set_deformer_weights_per_cv(
+                curve, deformer, weights, writer=INTERIM_WEIGHTS_WRITER,
+                previous_values=written)
+        self.editing = False
+        self.written_weights = {}
+        self.initial_weights = {}
+        open_undochunk()
+        self.weightschanged(previous_weights=restored_weights)
+        close_undochunk()
+
     def _call_smooth_all(self):
         for controlpoint in self.bezierequalizer.controlpoints:
             controlpoint.linear = False
-        self.bezierequalizer.repaint()
+        self.bezierequalizer.invalidateCurve()
+        self.bezierequalizer.update()
         self.weightschanged()
 
     def _call_smooth_selected(self):
         for controlpoint in self.bezierequalizer.controlpoints:
             if controlpoint.selected:
                 controlpoint.linear = False
-        self.bezierequalizer.repaint()
+        self.bezierequalizer.invalidateCurve()
+        self.bezierequalizer.update()
         self.weightschanged()
 
     def _call_linear_selected(self):
         for controlpoint in self.bezierequalizer.controlpoints:
             if controlpoint.selected:
                 controlpoint.linear = True
-        self.bezierequalizer.repaint()
+        self.bezierequalizer.invalidateCurve()
+        self.bezierequalizer.update()
         self.weightschanged()
 
     def _call_linear_all(self):
         for controlpoint in self.bezierequalizer.controlpoints:
             controlpoint.linear = True
-        self.bezierequalizer.repaint()
+        self.bezierequalizer.invalidateCurve()
+        self.bezierequalizer.update()
         self.weightschanged()
 
     def _call_update_values(self, *_):
@@ -147,87 +281,91 @@ class CurveDeformerEditor(QtWidgets.QWidget):
         if not deformer or not self.curves:
             self.bezierequalizer.setValues([])
             return
-        # if the deformer was already edited in the current session, this get
-        # his saved controlpoints. If it's not, it generate controlpoints from
-        # current deformer weights.
-        curves = self.controlpoints_per_deformers.get(deformer)
-        if curves:
-            controlpoints = curves.get(self.curves[0])
-            if controlpoints:
-                self.bezierequalizer.controlpoints = controlpoints
-                self.bezierequalizer.repaint()
-                return
+        # if the deformer was already edited, in the current session or
+        # before the scene was saved, this get his saved controlpoints. If
+        # it's not, it generate controlpoints from current deformer weights.
+        memory = self.controlpoints_per_deformers
+        snapshot = memory.get(deformer, self.curves[0])
+        if snapshot is not None:
+            # the snapshot is shared, the equalizer edits a copy of it.
+            self.bezierequalizer.controlpoints = snapshot.controlpoints()
+            self.bezierequalizer.update()
+            return
         values = get_deformer_weights_per_cv(self.curves[0], deformer)
-        self.bezierequalizer.setValues(values)
-
-    def _call_smooth_in(self):
-        self.bezierequalizer.setValues([0.0, 0.0, 1.0, 1.0])
-        for controlpoint in self.bezierequalizer.controlpoints:
-            controlpoint.linear = False
-        self.bezierequalizer.autoTangent()
-        self.bezierequalizer.repaint()
-        self.weightschanged()
-
-    def _call_smooth_out(self):
-        self.bezierequalizer.setValues([1.0, 1.0, 0.0, 0.0])
-        for controlpoint in self.bezierequalizer.controlpoints:
-            controlpoint.linear = False
-        self.bezierequalizer.autoTangent()
-        self.bezierequalizer.repaint()
-        self.weightschanged()
-
-    def _call_linear_in(self):
-        self.bezierequalizer.setValues([0.0, 1.0])
-        self.weightschanged()
-
-    def _call_linear_out(self):
-        self.bezierequalizer.setValues([1.0, 0.0])
-        self.weightschanged()
-
-    def _call_full(self):
-        self.bezierequalizer.setValues([1.0, 1.0])
-        self.weightschanged()
-
-    def _call_off(self):
-        self.bezierequalizer.setValues([0.0, 0.0])
-        self.weightschanged()
+        self.bezierequalizer.setValues(values, self.fitting_tolerance)
 
-    def _call_positive_spike(self):
-        self.bezierequalizer.setValues([0.0, 1.0, 0.0])
+    def _call_preset(self, name, *_):
+        self.bezierequalizer.setCurve(self.preset_library.get(name))
         self.weightschanged()
 
-    def _call_negative_spike(self):
-        self.bezierequalizer.setValues([1.0, 0.0, 1.0])
-        self.weightschanged()
+    def savePreset(self, name):
+        """ Add the edited curve to the preset library. """
+        self.preset_library.set(name, self.bezierequalizer.curve)
 
     def closeEvent(self, event):
         super(CurveDeformerEditor, self).closeEvent(event)
         self.unregister_callback()
+        close_sampling_pools()
 
     def hide(self):
         super(CurveDeformerEditor, self).hide()
         self.unregister_callback()
 
-    def weightschanged(self):
+    def weightschanged(self, preview=False, previous_weights=None):
+        """
+        Write the weights of the edited curve on the selected curves. The
+        previous weights per (curve, deformer) can be given to write only
+        the ranges which changed.
+        """
         deformer = self.deformers.currentText()
         if not deformer:
             return
+        # the curves sharing the same cv count share the same weights, those
+        # are evaluated once per distinct count.
+        samples = {
+            curve: resolution_cache.count_cv(curve) for curve in self.curves}
+        if preview is True and self.preview_sample:
+            sampled = self.bezierequalizer.values(self.preview_sample)
+            values = {
+                sample: resample_values(sampled, sample)
+                for sample in set(samples.values())}
+        else:
+            values = self.bezierequalizer.valuesPerSample(
+                samples.values(), self.sampling_threads)
         for curve in self.curves:
-            sample = count_cv(curve)
-            weights = self.bezierequalizer.values(sample)
-            set_deformer_weights_per_cv(curve, deformer, weights)
+            weights = values[samples[curve]]
+            if self.editing is False:
+                previous_values = (previous_weights or {}).get(
+                    (curve, deformer))
+                set_deformer_weights_per_cv(
+                    curve, deformer, weights, previous_values=previous_values)
+                continue
+            previous_values = self.written_weights.get((curve, deformer))
+            written = set_deformer_weights_per_cv(
+                curve, deformer, weights, writer=INTERIM_WEIGHTS_WRITER,
+                previous_values=previous_values)
+            self.written_weights[(curve, deformer)] = written
         # We store the edited control points in the widgets memories to reedit
         # the weights later.
-        if self.controlpoints_per_deformers.get(deformer) is None:
-            self.controlpoints_per_deformers[deformer] = {}
+        snapshot = BezierSnapshot(self.bezierequalizer.controlpoints)
         for curve in self.curves:
-            bezier = copy_bezier_curve(self.bezierequalizer.controlpoints)
-            self.controlpoints_per_deformers[deformer][curve] = bezier
+            self.controlpoints_per_deformers.set(deformer, curve, snapshot)
+        if preview is True or self.editing is True:
+            return
+        # The final state of an edit is saved in the scene as well.
+        data = self.controlpoints_per_deformers.store(
+            deformer, self.curves, snapshot)
+        set_deformer_profiles(deformer, data)
 
     def register_callback(self):
         method = self.maya_selection_changed
         cb = om.MEventMessage.addEventCallback('SelectionChanged', method)
         self.callbacks.append(cb)
+        # the curve/deformer resolution is cached during the edition, any
+        # connection change or curve topology edit can invalidate it.
+        method = resolution_cache.clear
+        cb = om.MDGMessage.addConnectionCallback(method)
+        self.callbacks.append(cb)
         if self.reset_memory_callbacks is not None:
             return
         self.reset_memory_callbacks = []
@@ -237,12 +375,27 @@ class CurveDeformerEditor(QtWidgets.QWidget):
             self.reset_memory_callbacks.append(cb)
 
     def unregister_callback(self):
-        for callback in self.callbacks:
+        for callback in self.callbacks + self.curves_callbacks:
             om.MMessage.removeCallback(callback)
         self.callbacks = []
+        self.curves_callbacks = []
 
     def reset_memory(self, *_):
-        self.controlpoints_per_deformers = {}
+        self.controlpoints_per_deformers.clear()
+        resolution_cache.clear()
+
+    def register_curves_callbacks(self, shapes):
+        for callback in self.curves_callbacks:
+            om.MMessage.removeCallback(callback)
+        self.curves_callbacks = []
+        for shape in shapes:
+            selection = om.MSelectionList()
+            selection.add(shape)
+            node = om.MObject()
+            selection.getDependNode(0, node)
+            method = curve_topology_changed
+            cb = om.MNodeMessage.addAttributeChangedCallback(node, method)
+            self.curves_callbacks.append(cb)
 
     def maya_selection_changed(self, *_):
         self.deformers.clear()
@@ -250,6 +403,7 @@ class CurveDeformerEditor(QtWidgets.QWidget):
             selection=True, dag=True, long=True, type='nurbsCurve',
             noIntermediate=True)
         self.curves = [cmds.listRelatives(s, parent=True)[0] for s in shapes]
+        self.register_curves_callbacks(shapes)
         if not self.curves:
             self.bezierequalizer.clear()
             self.setEnabled(False)
@@ -261,6 +415,14 @@ class CurveDeformerEditor(QtWidgets.QWidget):
         self._call_update_values()
 
 
+def curve_topology_changed(message, plug, *_):
+    if not message & om.MNodeMessage.kAttributeSet:
+        return
+    if plug.partialName(False, False, False, False, False, True) in (
+            'degree', 'spans'):
+        resolution_cache.clear()
+
+
 def open_undochunk():
     cmds.undoInfo(openChunk=True)
 
@@ -0,0 +1,154 @@
+import base64
+import collections
+import json
+from curvedeformereditor.beziercurve import (
+    BezierSnapshot, decode_beziercurve, encode_beziercurve)
+
+
+# Maximum size in bytes of the bezier snapshots kept in a memory.
+DEFAULT_MAXIMUM_SIZE = 32 * 1024 * 1024
+# Version of the profiles data written by encode_profiles.
+PROFILES_VERSION = 1
+
+
+class ControlPointsMemory():
+    """
+    This memory keep the bezier snapshots edited per deformer and curve.
+    The snapshots can be shared by several curves, a shared snapshot is
+    counted once in the memory size. When the size exceed the maximum, the
+    least recently used entries are dropped.
+    If a reader is given, the profiles saved on a deformer are read the
+    first time one of its curves is missing from the memory and the
+    snapshots are decoded curve per curve when they are asked. The reader
+    is a function returning the data written by encode_profiles for a
+    deformer, or None.
+    """
+    def __init__(self, maximum_size=DEFAULT_MAXIMUM_SIZE, reader=None):
+        self.maximum_size = maximum_size
+        self.reader = reader
+        self.snapshots = collections.OrderedDict()
+        self.references = {}
+        self.size = 0
+        # encoded profiles read or written per deformer: {deformer: {curve:
+        # encoded}}
+        self.stored = {}
+
+    def __len__(self):
+        return len(self.snapshots)
+
+    def __contains__(self, key):
+        return key in self.snapshots
+
+    def get(self, deformer, curve):
+        key = deformer, curve
+        snapshot = self.snapshots.pop(key, None)
+        if snapshot is None:
+            return self._load(deformer, curve)
+        # re-insert the entry to flag it as the most recently used
+        self.snapshots[key] = snapshot
+        return snapshot
+
+    def set(self, deformer, curve, snapshot):
+        key = deformer, curve
+        self._release(self.snapshots.pop(key, None))
+        self.snapshots[key] = snapshot
+        count = self.references.get(id(snapshot), 0)
+        if count == 0:
+            self.size += snapshot.nbytes
+        self.references[id(snapshot)] = count + 1
+        while self.size > self.maximum_size and len(self.snapshots) > 1:
+            _, dropped = self.snapshots.popitem(last=False)
+            self._release(dropped)
+
+    def _load(self, deformer, curve):
+        encoded = self._get_stored(deformer).get(curve)
+        if encoded is None:
+            return None
+        try:
+            snapshot = decode_snapshot(encoded)
+        except ValueError:
+            # an unreadable profile is ignored, the curve is rebuilt from its
+            # weights.
+            return None
+        self.set(deformer, curve, snapshot)
+        return snapshot
+
+    def _get_stored(self, deformer):
+        stored = self.stored.get(deformer)
+        if stored is not None:
+            return stored
+        data = self.reader(deformer) if self.reader is not None else None
+        try:
+            stored = decode_profiles(data) if data else {}
+        except (ValueError, KeyError, TypeError):
+            stored = {}
+        self.stored[deformer] = stored
+        return stored
+
+    def store(self, deformer, curves, snapshot):
+        """
+        Record the snapshot as the profile saved for the curves and return
+        the data to save on the deformer with the profiles of all its curves.
+        """
+        stored = self._get_stored(deformer)
+        encoded = encode_snapshot(snapshot)
+        for curve in curves:
+            stored[curve] = encoded
+        return encode_profiles(stored)
+
+    def _release(self, snapshot):
+        if snapshot is None:
+            return
+        count = self.references.pop(id(snapshot)) - 1
+        if count:
+            self.references[id(snapshot)] = count
+        else:
+            self.size -= snapshot.nbytes
+
+    def clear(self):
+        self.snapshots.clear()
+        self.references = {}
+        self.size = 0
+        self.stored = {}
+
+
+def encode_snapshot(snapshot):
+    data = encode_beziercurve(snapshot.controlpoints())
+    return base64.b64encode(data).decode('ascii')
+
+
+def decode_snapshot(encoded):
+    return BezierSnapshot(decode_beziercurve(base64.b64decode(encoded)))
+
+
+def encode_profiles(encoded_per_curve):
+    """
+    This function return the encoded snapshots per curve as a json string.
+    The curves sharing the same profile store it once.
+    """
+    profiles = []
+    indices = {}
+    curves = {}
+    for curve, encoded in sorted(encoded_per_curve.items()):
+        if encoded not in indices:
+            indices[encoded] = len(profiles)
+            profiles.append(encoded)
+        curves[curve] = indices[encoded]
+    data = {
+        'version': PROFILES_VERSION,
+        'profiles': profiles,
+        'curves': curves}
+    return json.dumps(data, sort_keys=True, separators=(',', ':'))
+
+
+def decode_profiles(data):
+    """
+    This function return the encoded snapshots per curve of a json string
+    written by encode_profiles.
+    """
+    data = json.loads(data)
+    if data.get('version') != PROFILES_VERSION:
+        raise ValueError(
+            'Unsupported profiles version: {}'.format(data.get('version')))
+    profiles = data['profiles']
+    return {curve: profiles[index] for curve, index in data['curves'].items()}
@@ -1,12 +1,19 @@
 import re
+import maya.OpenMaya as om
 from maya import cmds
+from curvedeformereditor.arrayutils import get_changed_ranges
 
 
 TARGETWEIGHT_ATTR = {
-    "blendShape": "inputTarget[{0}].inputTargetGroup[{0}].targetWeights[{1}]",
-    "cluster": "weightList[{0}].weights[{1}]",
-    "skinCluster": "weightList[{0}].weights[{1}]"
+    "blendShape": "inputTarget[{0}].inputTargetGroup[{0}].targetWeights",
+    "cluster": "weightList[{0}].weights",
+    "skinCluster": "weightList[{0}].weights"
 }
+# value of the weights never set in the deformer multi attribute.
+DEFAULT_WEIGHT = 1.0
+# Dynamic string attribute where the editor saves the bezier curves edited
+# on a deformer, see memory.encode_profiles.
+PROFILES_ATTR = "curveDeformerEditorProfiles"
 
 
 def find_curve_input_target_index(curve, deformer):
@@ -38,25 +45,215 @@ def find_curve_input_target_index(curve, deformer):
         return index
 
 
-def get_deformer_weights_per_cv(curve, deformer):
+def get_weights_attribute(curve, deformer):
+    """
+    This function return the multi attribute containing the weights of the
+    curve in the deformer, e.g. "cluster1.weightList[0].weights"
+    """
     attributename = TARGETWEIGHT_ATTR.get(cmds.nodeType(deformer))
     if attributename is None:
         raise ValueError("deformer is not supported: {}".format(deformer))
     index = find_curve_input_target_index(curve, deformer)
-    attr = deformer + "." + attributename
+    return deformer + "." + attributename.format(index)
+
+
+class ResolutionCache():
+    """
+    This cache keep the weights attribute resolved per (curve, deformer) and
+    the cv count per curve. Those lookups run several maya commands and the
+    result doesn't change while the weights are edited. The cache has to be
+    cleared when the scene connections or the curves topology change.
+    """
+    def __init__(self):
+        self.attributes = {}
+        self.cv_counts = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_weights_attribute(self, curve, deformer):
+        attribute = self.attributes.get((curve, deformer))
+        if attribute is not None:
+            self.hits += 1
+            return attribute
+        self.misses += 1
+        attribute = get_weights_attribute(curve, deformer)
+        self.attributes[(curve, deformer)] = attribute
+        return attribute
+
+    def count_cv(self, curve):
+        count = self.cv_counts.get(curve)
+        if count is not None:
+            self.hits += 1
+            return count
+        self.misses += 1
+        count = count_cv(curve)
+        self.cv_counts[curve] = count
+        return count
+
+    def clear(self, *_):
+        self.attributes = {}
+        self.cv_counts = {}
+
+    def statistics(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'attributes': len(self.attributes),
+            'cv_counts': len(self.cv_counts)}
+
+
+resolution_cache = ResolutionCache()
+
+
+def get_deformer_weights_per_cv(curve, deformer, reader=None):
+    """
+    This function return the weights of every cv of a curve in a deformer.
+    The reader is the name of the backend used to get the values from maya,
+    see WEIGHTS_READERS. By default, it uses DEFAULT_WEIGHTS_READER.
+    """
+    attribute = resolution_cache.get_weights_attribute(curve, deformer)
+    reader = WEIGHTS_READERS[reader or DEFAULT_WEIGHTS_READER]
+    return reader(attribute, resolution_cache.count_cv(curve))
+
+
+def read_weights_per_index(attribute, count):
+    """ Get the weights with one getAttr per index. """
     return [
-        cmds.getAttr(attr.format(index, i))
-        for i in range(count_cv(curve))]
+        cmds.getAttr("{}[{}]".format(attribute, i))
+        for i in range(count)]
 
 
-def set_deformer_weights_per_cv(curve, deformer, values):
-    attributename = TARGETWEIGHT_ATTR.get(cmds.nodeType(deformer))
-    if attributename is None:
-        raise ValueError("deformer is not supported: {}".format(deformer))
-    index = find_curve_input_target_index(curve, deformer)
-    attr = deformer + "." + attributename
-    for i, v in enumerate(values):
-        cmds.setAttr(attr.format(index, i), v)
+def read_weights_range(attribute, count):
+    """
+    Get all the weights with two getAttr: one for the existing indices of
+    the multi attribute and one for their values. The indices never set are
+    filled with the DEFAULT_WEIGHT.
+    """
+    weights = [DEFAULT_WEIGHT] * count
+    indices = cmds.getAttr(attribute, multiIndices=True)
+    if not indices:
+        return weights
+    values = cmds.getAttr(attribute)
+    # maya returns the values of a numeric multi attribute as a list holding
+    # one tuple, and a single value as a float.
+    if not isinstance(values, (list, tuple)):
+        values = [values]
+    elif len(values) == 1 and isinstance(values[0], (list, tuple)):
+        values = values[0]
+    for index, value in zip(indices, values):
+        if index < count:
+            weights[index] = value
+    return weights
+
+
+def read_weights_plug(attribute, count):
+    """
+    Get all the weights through the OpenMaya MPlug of the multi attribute.
+    The indices never set are filled with the DEFAULT_WEIGHT.
+    """
+    selection = om.MSelectionList()
+    selection.add(attribute)
+    plug = om.MPlug()
+    selection.getPlug(0, plug)
+    indices = om.MIntArray()
+    plug.getExistingArrayAttributeIndices(indices)
+    weights = [DEFAULT_WEIGHT] * count
+    for index in indices:
+        if index < count:
+            weights[index] = plug.elementByLogicalIndex(index).asDouble()
+    return weights
+
+
+WEIGHTS_READERS = {
+    "perindex": read_weights_per_index,
+    "range": read_weights_range,
+    "plug": read_weights_plug,
+}
+DEFAULT_WEIGHTS_READER = "range"
+
+
+def set_deformer_weights_per_cv(
+        curve, deformer, values, writer=None, previous_values=None,
+        tolerance=1e-4):
+    """
+    This function set the weights of every cv of a curve in a deformer.
+    The writer is the name of the backend used to set the values in maya,
+    see WEIGHTS_WRITERS. By default, it uses DEFAULT_WEIGHTS_WRITER.
+    If the previous values written are given, only the contiguous ranges of
+    values which changed more than the tolerance are set.
+    It returns the weights set in maya: the values skipped keep their
+    previous value. They have to be given as previous values of the next
+    write to not lose the small changes accumulated.
+    """
+    attribute = resolution_cache.get_weights_attribute(curve, deformer)
+    writer = WEIGHTS_WRITERS[writer or DEFAULT_WEIGHTS_WRITER]
+    if previous_values is None or len(previous_values) != len(values):
+        writer(attribute, values)
+        return values
+    ranges = get_changed_ranges(previous_values, values, tolerance)
+    if not ranges:
+        return previous_values
+    written = list(previous_values)
+    for start, end in ranges:
+        writer(attribute, values[start:end], start)
+        written[start:end] = values[start:end]
+    return written
+
+
+def write_weights_per_index(attribute, values, start=0):
+    """ Set the weights with one setAttr per index. """
+    for i, value in enumerate(values):
+        cmds.setAttr("{}[{}]".format(attribute, start + i), value)
+
+
+def write_weights_range(attribute, values, start=0):
+    """ Set all the weights with one multi index setAttr. """
+    if not values:
+        return
+    values = list(values)
+    plug = "{}[{}:{}]".format(attribute, start, start + len(values) - 1)
+    cmds.setAttr(plug, *values, size=len(values))
+
+
+def write_weights_plug(attribute, values, start=0):
+    """
+    Set all the weights through the OpenMaya MPlug of the multi attribute.
+    This skip the command layer but the change isn't undoable.
+    """
+    selection = om.MSelectionList()
+    selection.add(attribute)
+    plug = om.MPlug()
+    selection.getPlug(0, plug)
+    for i, value in enumerate(values):
+        plug.elementByLogicalIndex(start + i).setDouble(value)
+
+
+WEIGHTS_WRITERS = {
+    "perindex": write_weights_per_index,
+    "range": write_weights_range,
+    "plug": write_weights_plug,
+}
+DEFAULT_WEIGHTS_WRITER = "range"
+
+
+def get_deformer_profiles(deformer):
+    """
+    This function return the profiles saved on the deformer or None if the
+    deformer has no profiles attribute.
+    """
+    if not cmds.attributeQuery(PROFILES_ATTR, node=deformer, exists=True):
+        return None
+    return cmds.getAttr(deformer + "." + PROFILES_ATTR)
+
+
+def set_deformer_profiles(deformer, data):
+    """
+    This function save the profiles on the deformer. The profiles attribute
+    is added to the deformer if it doesn't exist yet.
+    """
+    if not cmds.attributeQuery(PROFILES_ATTR, node=deformer, exists=True):
+        cmds.addAttr(deformer, longName=PROFILES_ATTR, dataType="string")
+    cmds.setAttr(deformer + "." + PROFILES_ATTR, data, type="string")
 
 
 def count_cv(curve):
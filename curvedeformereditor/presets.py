@@ -0,0 +1,138 @@
+"""
+Library of weights profiles presets. A preset is a whole bezier curve, the
+tangents and the flags included. The presets are saved as a json file where
+every curve is stored as the base64 of its compact encoding, see
+beziercurve.encode_beziercurve.
+"""
+import base64
+import collections
+import json
+from curvedeformereditor.beziercurve import (
+    BezierCurve, BezierSnapshot, decode_beziercurve, encode_beziercurve)
+from curvedeformereditor.nurbsutils import (
+    resolution_cache, set_deformer_weights_per_cv)
+
+
+# Version of the presets file written by PresetLibrary.save.
+PRESETS_FILE_VERSION = 1
+# Presets available in every library: name, values and smooth. The smooth
+# presets get automatic tangents, the others are linear.
+DEFAULT_PRESETS = (
+    ('smooth_in', (0.0, 0.0, 1.0, 1.0), True),
+    ('smooth_out', (1.0, 1.0, 0.0, 0.0), True),
+    ('linear_in', (0.0, 1.0), False),
+    ('linear_out', (1.0, 0.0), False),
+    ('full', (1.0, 1.0), False),
+    ('off', (0.0, 0.0), False),
+    ('positive_spike', (0.0, 1.0, 0.0), False),
+    ('negative_spike', (1.0, 0.0, 1.0), False),
+)
+
+
+def create_default_preset(values, smooth):
+    curve = BezierCurve.from_values(values, linear=True)
+    if smooth is True:
+        for controlpoint in curve.controlpoints:
+            controlpoint.linear = False
+        curve.auto_tangent()
+    return curve
+
+
+class PresetLibrary():
+    """
+    The presets are decoded once when they are loaded and kept as immutable
+    snapshots. The weights sampled from a preset are cached per cv count as
+    long as the preset isn't replaced.
+    """
+    def __init__(self, filename=None):
+        self.snapshots = collections.OrderedDict()
+        self.values_cache = {}
+        for name, values, smooth in DEFAULT_PRESETS:
+            self.set(name, create_default_preset(values, smooth))
+        if filename is not None:
+            self.load(filename)
+
+    def __len__(self):
+        return len(self.snapshots)
+
+    def __contains__(self, name):
+        return name in self.snapshots
+
+    def names(self):
+        return list(self.snapshots)
+
+    def get(self, name):
+        """ Return an editable copy of the preset curve. """
+        return BezierCurve(self.snapshots[name].controlpoints())
+
+    def set(self, name, curve):
+        self.snapshots[name] = BezierSnapshot(curve.controlpoints)
+        self._clear_values(name)
+
+    def remove(self, name):
+        del self.snapshots[name]
+        self._clear_values(name)
+
+    def _clear_values(self, name):
+        for key in [key for key in self.values_cache if key[0] == name]:
+            del self.values_cache[key]
+
+    def values_per_sample(self, name, samples):
+        """
+        Return the preset weights per sample. The samples not cached yet are
+        evaluated at once.
+        """
+        samples = set(samples)
+        missing = [s for s in samples if (name, s) not in self.values_cache]
+        if missing:
+            values = self.get(name).values_per_sample(missing)
+            for sample in missing:
+                self.values_cache[(name, sample)] = values[sample]
+        return {s: self.values_cache[(name, s)] for s in samples}
+
+    def data(self, names=None):
+        names = self.names() if names is None else names
+        presets = collections.OrderedDict()
+        for name in names:
+            controlpoints = self.snapshots[name].controlpoints()
+            encoded = base64.b64encode(encode_beziercurve(controlpoints))
+            presets[name] = encoded.decode('ascii')
+        return {'version': PRESETS_FILE_VERSION, 'presets': presets}
+
+    def update(self, data):
+        """
+        Add the presets of a data dictionnary written by PresetLibrary.data,
+        the presets with the same name are replaced.
+        """
+        if data.get('version') != PRESETS_FILE_VERSION:
+            raise ValueError(
+                'Unsupported presets version: {}'.format(data.get('version')))
+        for name, encoded in data['presets'].items():
+            controlpoints = decode_beziercurve(base64.b64decode(encoded))
+            self.set(name, BezierCurve(controlpoints))
+
+    def load(self, filename):
+        with open(filename, 'r') as f:
+            self.update(json.load(f))
+
+    def save(self, filename, names=None):
+        with open(filename, 'w') as f:
+            json.dump(self.data(names), f, indent=2)
+
+
+preset_library = PresetLibrary()
+
+
+def apply_preset(name, curves, deformers, library=None, writer=None):
+    """
+    This function set the weights of a preset on every curve in every
+    deformer without going through the editor. Every curve has to be deformed
+    by every deformer. The preset is evaluated once per distinct cv count.
+    """
+    library = preset_library if library is None else library
+    samples = {curve: resolution_cache.count_cv(curve) for curve in curves}
+    values = library.values_per_sample(name, samples.values())
+    for deformer in deformers:
+        for curve in curves:
+            set_deformer_weights_per_cv(
+                curve, deformer, values[samples[curve]], writer=writer)
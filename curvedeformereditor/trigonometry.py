@@ -1,8 +1,77 @@
 import math
-from PySide2 import QtCore
 from curvedeformereditor.arrayutils import split_value, get_break_indices
 
 
+class Point(object):
+    """
+    Qt free 2d point. It has the same accessors as the QPointF, the curve
+    functions accept both.
+    """
+    __slots__ = '_x', '_y'
+
+    def __init__(self, x=0.0, y=0.0):
+        self._x = float(x)
+        self._y = float(y)
+
+    def x(self):
+        return self._x
+
+    def y(self):
+        return self._y
+
+    def setX(self, x):
+        self._x = float(x)
+
+    def setY(self, y):
+        self._y = float(y)
+
+    def __repr__(self):
+        return 'Point({}, {})'.format(self._x, self._y)
+
+
+class Rect(object):
+    """
+    Qt free rectangle. It has the same accessors as the QRectF, the curve
+    functions accept both.
+    """
+    __slots__ = '_x', '_y', '_width', '_height'
+
+    def __init__(self, x, y, width, height):
+        self._x = float(x)
+        self._y = float(y)
+        self._width = float(width)
+        self._height = float(height)
+
+    def left(self):
+        return self._x
+
+    def top(self):
+        return self._y
+
+    def right(self):
+        return self._x + self._width
+
+    def bottom(self):
+        return self._y + self._height
+
+    def width(self):
+        return self._width
+
+    def height(self):
+        return self._height
+
+
+def clamp_point_in_rect(point, rect):
+    if point.x() < rect.left():
+        point.setX(rect.left())
+    if point.x() > rect.right():
+        point.setX(rect.right())
+    if point.y() < rect.top():
+        point.setY(rect.top())
+    if point.y() > rect.bottom():
+        point.setY(rect.bottom())
+
+
 def compute_ray_limit(angle, point1, point2):
     limit_x = abs(point1.x() - point2.x())
     limit_y = abs(point1.y() - point2.y())
@@ -16,11 +85,11 @@ def compute_ray_limit(angle, point1, point2):
 def point_on_circle(angle, ray, center):
     x = ray * math.cos(float(angle))
     y = ray * math.sin(float(angle))
-    return QtCore.QPointF(center.x() + x, center.y() + y)
+    return Point(center.x() + x, center.y() + y)
 
 
 def compute_angle(point1, point2):
-    point3 = QtCore.QPointF(point2.x(), point1.y())
+    point3 = Point(point2.x(), point1.y())
     return math.radians(compute_absolute_angle_c(point3, point2, point1))
 
 
@@ -63,13 +132,3 @@ def distance(a, b):
     x = (b.x() - a.x())**2
     y = (b.y() - a.y())**2
     return math.sqrt(abs(x + y))
-
-
-def move_point_from_resized_rect(point, old_size, new_size):
-    """
-    This function move a point with a reference size and a new size.
-    """
-    x = (point.x() / old_size.width()) * new_size.width()
-    y = (point.y() / old_size.height()) * new_size.height()
-    point.setX(x)
-    point.setY(y)
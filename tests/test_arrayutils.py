@@ -0,0 +1,48 @@
+import random
+import unittest
+from curvedeformereditor.arrayutils import (
+    get_break_indices, get_break_indices_array, numpy, split_value,
+    split_value_array)
+
+
+LENGTHS = 0, 1, 2, 3, 10, 1000
+
+
+def random_values(length, seed=0):
+    generator = random.Random(seed)
+    return [generator.random() for _ in range(length)]
+
+
+def stair_values(length):
+    # flat steps and linear ramps, with breaks and straight runs.
+    return [
+        float(i // 7) + (i % 7) * 0.25 * (i // 7 % 2) for i in range(length)]
+
+
+@unittest.skipIf(numpy is None, 'numpy is not available')
+class TestArrayVersions(unittest.TestCase):
+    """
+    The numpy versions have to return the same results as the pure python
+    functions.
+    """
+    def test_get_break_indices(self):
+        for length in LENGTHS:
+            for values in (random_values(length), stair_values(length)):
+                self.assertEqual(
+                    get_break_indices_array(values).tolist(),
+                    get_break_indices(values))
+                # get_break_indices dispatch the arrays to the numpy version.
+                self.assertEqual(
+                    get_break_indices(numpy.array(values)).tolist(),
+                    get_break_indices(values))
+
+    def test_split_value(self):
+        for sample in LENGTHS[3:]:
+            for value in (1.0, 100.0):
+                self.assertEqual(
+                    split_value_array(value, sample).tolist(),
+                    split_value(value, sample))
+
+
+if __name__ == '__main__':
+    unittest.main()
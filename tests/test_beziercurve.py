@@ -0,0 +1,208 @@
+import random
+import unittest
+import math
+from curvedeformereditor.beziercurve import (
+    BezierCurve, ControlPoint, ControlPointIndex, CENTER, TANGENTIN,
+    TANGENTOUT, insert_controlpoint_sorted, reorder_controlpoint,
+    auto_tangent_neighbourhood, close_sampling_pools,
+    PARALLEL_SAMPLING_MINIMUM, numpy)
+from curvedeformereditor import beziercurve
+from curvedeformereditor.trigonometry import Point, distance
+
+
+SAMPLES = 2, 17, 200
+TOLERANCE = 1e-4
+# Size in pixels of the view the control points are picked in.
+VIEW_SCALE = 400.0, 150.0
+
+
+def random_beziercurve(seed):
+    generator = random.Random(seed)
+    values = [generator.random() for _ in range(generator.randint(2, 20))]
+    return BezierCurve.from_values(values, linear=False)
+
+
+@unittest.skipIf(numpy is None, 'numpy is not available')
+class TestSamplingParity(unittest.TestCase):
+    """
+    The batch evaluation with numpy has to return the values of the pure
+    python evaluation, e.g. the preview and the final weights push use both.
+    """
+    def test_values_per_sample(self):
+        for seed in range(300):
+            curve = random_beziercurve(seed)
+            batch = curve.values_per_sample(SAMPLES)
+            for sample in SAMPLES:
+                values = curve.values(sample)
+                for value, batched in zip(values, batch[sample]):
+                    self.assertAlmostEqual(
+                        value, batched, delta=TOLERANCE,
+                        msg='seed {}, sample {}'.format(seed, sample))
+
+    def test_threads(self):
+        # The chunks evaluated by the threads are gathered in order.
+        curve = random_beziercurve(0)
+        samples = 17, PARALLEL_SAMPLING_MINIMUM
+        try:
+            self.assertEqual(
+                curve.values_per_sample(samples, threads=3),
+                curve.values_per_sample(samples, threads=1))
+            self.assertIn(3, beziercurve._sampling_pools)
+        finally:
+            close_sampling_pools()
+        self.assertEqual(beziercurve._sampling_pools, {})
+
+
+def get_view_distance(controlpoint, offset, point, scale):
+    coordinates = controlpoint.coordinates()
+    return math.hypot(
+        (coordinates[offset] - point.x() / scale[0]) * scale[0],
+        (coordinates[offset + 1] - point.y() / scale[1]) * scale[1])
+
+
+def brute_pick(controlpoints, point, tolerance, offsets, scale):
+    distances = [
+        (get_view_distance(controlpoint, offset, point, scale), controlpoint)
+        for controlpoint in controlpoints for offset in offsets]
+    distances = [d for d in distances if d[0] < tolerance]
+    return min(distances, key=lambda d: d[0])[1] if distances else None
+
+
+def brute_around(controlpoints, point, radius, offsets, scale):
+    return set(
+        id(controlpoint) for controlpoint in controlpoints
+        if any(
+            get_view_distance(controlpoint, offset, point, scale) <= radius
+            for offset in offsets))
+
+
+class TestControlPointIndex(unittest.TestCase):
+    """
+    The index has to answer the queries of a linear scan over the control
+    points, in the view space, after every kind of edit.
+    """
+    def setUp(self):
+        self.generator = random.Random(0)
+        self.curve = random_beziercurve(3)
+        self.scale = VIEW_SCALE
+        self.index = ControlPointIndex(self.curve.controlpoints, self.scale)
+
+    def random_point(self):
+        return Point(
+            self.generator.uniform(-10, self.scale[0] + 10),
+            self.generator.uniform(-10, self.scale[1] + 10))
+
+    def near_point(self):
+        # A point a few pixels away from a center or a tangent.
+        controlpoint = self.generator.choice(self.curve.controlpoints)
+        offset = self.generator.choice((CENTER, TANGENTIN, TANGENTOUT))
+        coordinates = controlpoint.coordinates()
+        x = coordinates[offset] * self.scale[0]
+        y = coordinates[offset + 1] * self.scale[1]
+        return Point(
+            x + self.generator.uniform(-6, 6),
+            y + self.generator.uniform(-6, 6))
+
+    def assert_queries(self):
+        controlpoints = self.curve.controlpoints
+        self.assertEqual(len(self.index), len(controlpoints))
+        self.assertEqual(self.index.xs, sorted(self.index.xs))
+        for i in range(200):
+            point = self.near_point() if i % 2 else self.random_point()
+            self.assertIs(
+                self.index.pick_center(point),
+                brute_pick(controlpoints, point, 8, (CENTER, ), self.scale))
+            self.assertIs(
+                self.index.pick_tangent(point),
+                brute_pick(
+                    controlpoints, point, 8, (TANGENTIN, TANGENTOUT),
+                    self.scale))
+            around = self.index.around(point, 20)
+            self.assertEqual(len(around), len(set(map(id, around))))
+            self.assertEqual(
+                set(map(id, around)),
+                brute_around(controlpoints, point, 20, (CENTER, ), self.scale))
+
+    def test_queries(self):
+        self.assert_queries()
+
+    def test_scale_change(self):
+        # The index is stored in the curve space, only the scale changes
+        # when the view is resized.
+        self.scale = 123.0, 321.0
+        self.index.scale = self.scale
+        self.assert_queries()
+
+    def test_insert(self):
+        for _ in range(10):
+            point = Point(self.generator.random(), self.generator.random())
+            controlpoint = ControlPoint(point)
+            insert_controlpoint_sorted(self.curve.controlpoints, controlpoint)
+            self.index.add(controlpoint)
+        self.assert_queries()
+
+    def test_delete(self):
+        controlpoints = self.curve.controlpoints
+        for _ in range(len(controlpoints) // 2):
+            controlpoint = controlpoints.pop(
+                self.generator.randrange(len(controlpoints)))
+            self.index.remove(controlpoint)
+        self.assert_queries()
+
+    def test_sort(self):
+        # A control point dragged over its neighbours is reordered and the
+        # index updated for the moved control point only.
+        controlpoints = self.curve.controlpoints
+        for _ in range(10):
+            index = self.generator.randrange(len(controlpoints))
+            controlpoint = controlpoints[index]
+            controlpoint.move(
+                Point(self.generator.random(), self.generator.random()))
+            reorder_controlpoint(controlpoints, index)
+            self.index.update((controlpoint, ))
+        self.assertEqual(controlpoints, sorted(controlpoints))
+        self.assert_queries()
+
+
+class TestFittedCurve(unittest.TestCase):
+    """
+    The control points of a fitted curve have to behave like the others once
+    they are edited: the edited one and its neighbours get auto tangents.
+    """
+    def setUp(self):
+        values = [math.sin(i / 10.0) * 0.5 + 0.5 for i in range(60)]
+        self.curve = BezierCurve.from_values(
+            values, linear=True, tolerance=5e-3)
+
+    def test_fitted(self):
+        self.assertLess(len(self.curve), 60)
+        for controlpoint in self.curve.controlpoints:
+            self.assertTrue(controlpoint.autotangent)
+            self.assertFalse(controlpoint.linear)
+
+    def test_edit(self):
+        controlpoints = self.curve.controlpoints
+        index = len(controlpoints) // 2
+        untouched = [
+            controlpoint.coordinates() for i, controlpoint in
+            enumerate(controlpoints) if abs(i - index) > 1]
+        controlpoint = controlpoints[index]
+        center = controlpoint.center
+        controlpoint.move(Point(center.x(), center.y() + 0.2))
+        auto_tangent_neighbourhood(controlpoints, index)
+        # The smoothed tangents are 0.3 times the distance to the neighbours.
+        for i in range(index - 1, index + 2):
+            before, controlpoint, after = controlpoints[i - 1:i + 2]
+            self.assertAlmostEqual(
+                distance(controlpoint.center, controlpoint.tangentin),
+                distance(controlpoint.center, before.center) * 0.3)
+            self.assertAlmostEqual(
+                distance(controlpoint.center, controlpoint.tangentout),
+                distance(controlpoint.center, after.center) * 0.3)
+        self.assertEqual(untouched, [
+            controlpoint.coordinates() for i, controlpoint in
+            enumerate(controlpoints) if abs(i - index) > 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
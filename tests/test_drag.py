@@ -0,0 +1,54 @@
+"""
+Regression test of the maya commands produced by a whole drag in the editor,
+driven through the in-memory maya of benchmarks.fakemaya.
+"""
+import unittest
+try:
+    from PySide2 import QtWidgets
+except ImportError:
+    QtWidgets = None
+
+
+CURVE_COUNTS = 1, 10
+CV_COUNTS = 10, 100
+DRAG_MOVES = 20
+
+
+@unittest.skipIf(QtWidgets is None, 'PySide2 is not available')
+class TestDragCommands(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # benchmarks.run installs the fake maya and the offscreen platform.
+        from benchmarks import run
+        cls.benchmarks = run
+        cls.application = (
+            QtWidgets.QApplication.instance() or QtWidgets.QApplication([]))
+
+    def drag(self, curves_count, cvs_count):
+        run = self.benchmarks
+        editor = run.create_editor_scene(curves_count, cvs_count)
+        run.fakescene.reset_calls()
+        try:
+            run.drag(editor, DRAG_MOVES)
+        finally:
+            editor.unregister_callback()
+            editor.deleteLater()
+        return dict(run.fakescene.calls), run.fakescene.scene.undo_queue
+
+    def test_drag_commands(self):
+        for curves_count in CURVE_COUNTS:
+            for cvs_count in CV_COUNTS:
+                calls, undo_queue = self.drag(curves_count, cvs_count)
+                message = '{} curves, {} cvs'.format(curves_count, cvs_count)
+                # one undoable weights write per curve at the end of the
+                # drag and the profiles saved on the deformer.
+                self.assertEqual(
+                    calls.get('cmds.setAttr'), curves_count + 1, message)
+                self.assertEqual(calls.get('cmds.undoInfo'), 2, message)
+                self.assertEqual(len(undo_queue), 1, message)
+                self.assertEqual(
+                    len(undo_queue[0]), curves_count + 1, message)
+
+
+if __name__ == '__main__':
+    unittest.main()
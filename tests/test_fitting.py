@@ -0,0 +1,95 @@
+import math
+import random
+import unittest
+from curvedeformereditor import fitting
+from curvedeformereditor.fitting import (
+    evaluate_fit, fit_values, get_worst_indices)
+
+
+TOLERANCES = 1e-1, 1e-2, 1e-3
+
+
+def random_values(length, seed=0):
+    generator = random.Random(seed)
+    return [generator.random() for _ in range(length)]
+
+
+def sine_values(length):
+    return [math.sin(i / 7.0) * 0.5 + 0.5 for i in range(length)]
+
+
+def bumps_values(length, count):
+    # flat values with a bump in the middle of every part.
+    width = length // count
+    return [
+        math.sin(math.pi * (i % width) / width) ** 8 for i in range(length)]
+
+
+class TestFitting(unittest.TestCase):
+    """
+    The fitting is tested with numpy and with the pure python fallback.
+    """
+    def run_both(self, function):
+        numpy = fitting.numpy
+        try:
+            if numpy is not None:
+                function()
+            fitting.numpy = None
+            function()
+        finally:
+            fitting.numpy = numpy
+
+    def assert_fitted(self, values, tolerance):
+        knots, slopes = fit_values(values, tolerance, time_limit=None)
+        self.assertEqual(knots, sorted(set(knots)))
+        self.assertEqual((knots[0], knots[-1]), (0, len(values) - 1))
+        fitted = evaluate_fit(values, knots, slopes)
+        error = max(abs(a - b) for a, b in zip(values, fitted))
+        self.assertLessEqual(error, tolerance)
+
+    def test_tolerance(self):
+        def test():
+            for tolerance in TOLERANCES:
+                for values in (
+                        random_values(50), sine_values(200),
+                        bumps_values(300, 3)):
+                    self.assert_fitted(values, tolerance)
+                self.assert_fitted([0.0, 1.0], tolerance)
+                self.assert_fitted([0.0, 1.0, 0.0], tolerance)
+        self.run_both(test)
+
+    def test_worst_indices(self):
+        errors = [0.0, 0.5, 0.2, 0.0, 0.0, 0.3, 0.9, 0.1, 0.2]
+        expected = [1, 6, 8]
+
+        def test():
+            # the numpy version expects the errors as an array.
+            array = fitting.numpy.array if fitting.numpy is not None else list
+            self.assertEqual(
+                get_worst_indices(array(errors), 0.15), expected)
+            self.assertEqual(get_worst_indices(array(errors[:1]), 0.15), [])
+        self.run_both(test)
+
+    def test_knot_per_run(self):
+        # The first pass is a flat line, every bump is a run out of the
+        # tolerance and gets a knot on its peak.
+        values = bumps_values(300, 3)
+        peaks = [50, 150, 250]
+
+        def test():
+            knots = fit_values(values, 1e-2, time_limit=None)[0]
+            for peak in peaks:
+                self.assertIn(peak, knots)
+        self.run_both(test)
+
+    def test_time_limit(self):
+        values = random_values(2000)
+
+        def test():
+            self.assertIsNone(fit_values(values, 1e-6, time_limit=0))
+            self.assertIsNotNone(fit_values(values, 1e-6, time_limit=None))
+        self.run_both(test)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+"""
+Weights I/O tests on the in-memory maya of benchmarks.fakemaya.
+"""
+import unittest
+from benchmarks import fakemaya
+
+
+fakescene = fakemaya.install()
+from curvedeformereditor import nurbsutils  # noqa: E402
+
+
+class TestWeightsReaders(unittest.TestCase):
+    def setUp(self):
+        fakescene.new_scene()
+        nurbsutils.resolution_cache.clear()
+        self.curve = fakescene.create_curve('curve1', degree=3, spans=3)
+        fakescene.create_deformer('cluster1', 'cluster', [self.curve])
+
+    def test_readers(self):
+        # the indices 0 and 5 are never set and keep the default weight.
+        attribute = nurbsutils.get_weights_attribute(self.curve, 'cluster1')
+        nurbsutils.write_weights_range(attribute, [0.1, 0.2, 0.3, 0.4], 1)
+        expected = [1.0, 0.1, 0.2, 0.3, 0.4, 1.0]
+        for reader in nurbsutils.WEIGHTS_READERS:
+            weights = nurbsutils.get_deformer_weights_per_cv(
+                self.curve, 'cluster1', reader=reader)
+            self.assertEqual(weights, expected, reader)
+
+    def test_single_weight(self):
+        attribute = nurbsutils.get_weights_attribute(self.curve, 'cluster1')
+        nurbsutils.write_weights_range(attribute, [0.5], 2)
+        weights = nurbsutils.get_deformer_weights_per_cv(
+            self.curve, 'cluster1', reader='range')
+        self.assertEqual(weights, [1.0, 1.0, 0.5, 1.0, 1.0, 1.0])
+
+
+if __name__ == '__main__':
+    unittest.main()